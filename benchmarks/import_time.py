@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""measure interpreter startup cost of `numerapi` in fresh processes
+
+`import` and `construct` should cost about the same as the bare interpreter;
+the HTTP stack is only paid for in `first use`. `eager deps` is what every
+import used to pay before the manager was built lazily.
+
+usage:
+    python -m benchmarks.import_time [--repeat N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPETS = (
+    ('interpreter', 'pass'),
+    ('import', 'import numerapi'),
+    ('construct', 'import numerapi; numerapi.NumerAPI()'),
+    ('first use', 'import numerapi; numerapi.NumerAPI().manager.session'),
+    ('eager deps', 'import requests, zope.interface'),
+)
+
+
+def time_snippet(code: str, repeat: int) -> float:
+    """median wall clock time in milliseconds to run `code` in a new interpreter"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    for name, code in SNIPPETS:
+        print('{:<12} {:8.1f}ms'.format(name, time_snippet(code, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""local stand-in for a Redis server, enough for `numerapi.cache.RedisCache`
+
+Understands PING, SELECT, GET, SET (with EX or PX) and DEL over the Redis
+protocol and keeps everything in memory.
+"""
+import socketserver
+import threading
+import time
+
+
+class MockKeyValueServer(object):
+    """threaded TCP server, use as a context manager; `address` is (host, port)"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.data = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self) -> tuple:
+        return self._server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def execute(self, args: list) -> bytes:
+        name = args[0].upper()
+        with self._lock:
+            self.commands += 1
+            if name in (b'PING', b'SELECT'):
+                return b'+OK\r\n' if name == b'SELECT' else b'+PONG\r\n'
+            if name == b'GET':
+                value, expires = self.data.get(args[1], (None, None))
+                if value is None or (expires is not None and expires < time.time()):
+                    return b'$-1\r\n'
+                return b'$%d\r\n%s\r\n' % (len(value), value)
+            if name == b'SET':
+                expires = None
+                if len(args) == 5:
+                    scale = 1000 if args[3].upper() == b'PX' else 1
+                    expires = time.time() + int(args[4]) / scale
+                self.data[args[1]] = (args[2], expires)
+                return b'+OK\r\n'
+            if name == b'DEL':
+                return b':%d\r\n' % sum(self.data.pop(key, None) is not None for key in args[1:])
+        return b'-ERR unknown command\r\n'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    line = self.rfile.readline()
+                    if not line.startswith(b'*'):
+                        return
+                    args = []
+                    for _ in range(int(line[1:])):
+                        length = int(self.rfile.readline()[1:])
+                        args.append(self.rfile.read(length + 2)[:-2])
+                    self.wfile.write(server.execute(args))
+
+        return Handler
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""benchmark the HTTP path of `NumerApiManager` against a local mock server
+
+usage:
+    python -m benchmarks.run                       # run and print results
+    python -m benchmarks.run --save baseline.json  # store a baseline
+    python -m benchmarks.run --compare baseline.json
+
+with `--compare` the process exits non-zero if any benchmark got slower than
+the baseline by more than `--tolerance`.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.server import MockNumeraiServer, write_predictions
+from numerapi.api_manager import NumerApiManager
+from numerapi.numerapi import NumerAPI
+from numerapi.validation import validate_predictions
+
+
+def measure(func, repeat: int) -> dict:
+    """call `func` `repeat` times and summarise latencies in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    total = sum(timings) / 1000
+    return {
+        'repeat': repeat,
+        'min_ms': timings[0],
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'mean_ms': statistics.mean(timings),
+        'ops_per_s': repeat / total if total else float('inf'),
+    }
+
+
+def run(leaderboard_size: int, dataset_rows: int, repeat: int) -> dict:
+    results = {}
+    with MockNumeraiServer(leaderboard_size, dataset_rows) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        manager = NumerApiManager(api_url=server.url)
+        api = NumerAPI(public_id='foo', secret_key='bar', manager=manager)
+        dataset_mb = len(server.dataset) / 1e6
+
+        results['raw_query'] = measure(
+            lambda: manager.raw_query('query {dataset}'), repeat)
+        results['leaderboard'] = measure(lambda: api.get_leaderboard(0), repeat)
+
+        zip_path = os.path.join(tmp, 'numerai_dataset.zip')
+
+        def download():
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            manager.download_data_set(zip_path)
+        results['download'] = measure(download, repeat)
+        results['download']['mb_per_s'] = dataset_mb * results['download']['ops_per_s']
+
+        counter = iter(range(repeat))
+
+        def unzip():
+            api.unzip_data_set(tmp, zip_path, 'run{}.zip'.format(next(counter)))
+        results['unzip'] = measure(unzip, repeat)
+        results['unzip']['mb_per_s'] = dataset_mb * results['unzip']['ops_per_s']
+
+        tournament = os.path.join(tmp, 'run0', 'numerai_tournament_data.csv')
+        predictions = os.path.join(tmp, 'predictions.csv')
+        write_predictions(tournament, predictions)
+        results['upload'] = measure(
+            lambda: api.upload_predictions(predictions, tournament_data_path=tournament), repeat)
+
+        large = os.path.join(tmp, 'large_predictions.csv')
+        with open(large, 'w') as fh:
+            fh.write('id,probability\n')
+            fh.writelines('{},0.5{}\n'.format(i, i % 10) for i in range(300000))
+        results['validate'] = measure(lambda: validate_predictions(large), repeat)
+
+    results['_params'] = {'leaderboard_size': leaderboard_size,
+                          'dataset_rows': dataset_rows, 'repeat': repeat}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """return the names of benchmarks whose median regressed"""
+    regressions = []
+    for name, stats in results.items():
+        if name.startswith('_') or name not in baseline:
+            continue
+        old, new = baseline[name]['median_ms'], stats['median_ms']
+        if new > old * (1 + tolerance):
+            regressions.append('{}: {:.2f}ms -> {:.2f}ms'.format(name, old, new))
+    return regressions
+
+
+def print_results(results: dict):
+    for name, stats in sorted(results.items()):
+        if name.startswith('_'):
+            continue
+        line = '{:<12} median {:9.2f}ms  p95 {:9.2f}ms  {:9.1f} ops/s'.format(
+            name, stats['median_ms'], stats['p95_ms'], stats['ops_per_s'])
+        if 'mb_per_s' in stats:
+            line += '  {:8.1f} MB/s'.format(stats['mb_per_s'])
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leaderboard-size', type=int, default=1000,
+                        help='rows in the synthetic leaderboard (1k-100k)')
+    parser.add_argument('--dataset-rows', type=int, default=10000,
+                        help='rows per csv file in the synthetic dataset')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--save', metavar='PATH', help='write results as baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown before failing')
+    args = parser.parse_args(argv)
+
+    results = run(args.leaderboard_size, args.dataset_rows, args.repeat)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
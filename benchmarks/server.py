@@ -0,0 +1,241 @@
+"""local stand-in for the Numerai GraphQL endpoint, dataset download and
+prediction upload URLs
+
+The server only understands the queries sent by `NumerApiManager`; it picks
+the response by looking at the fields named in the query document.
+"""
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DATASET_PATH = '/dataset/numerai_dataset.zip'
+UPLOAD_PATH = '/upload/predictions.csv'
+GRAPHQL_PATH = '/'
+
+N_FEATURES = 21
+
+
+def make_leaderboard(n_rows: int, seed: int = 0) -> list:
+    """synthetic leaderboard with the fields of `get_leaderboard`"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        payment = {'nmrAmount': round(rng.random(), 2),
+                   'usdAmount': round(rng.random() * 10, 2)}
+        rows.append({
+            'consistency': rng.choice([50, 58.33, 66.67, 75, 83.33, 91.67]),
+            'concordance': {'pending': False, 'value': rng.random() > 0.1},
+            'originality': {'pending': False, 'value': rng.random() > 0.1},
+            'liveLogloss': 0.69 + rng.random() / 100,
+            'submissionId': str(uuid.UUID(int=rng.getrandbits(128))),
+            'username': 'user{}'.format(i),
+            'validationLogloss': 0.69 + rng.random() / 100,
+            'paymentGeneral': payment if i % 3 == 0 else None,
+            'paymentStaking': None,
+            'totalPayments': payment,
+            'stake': {'insertedAt': None, 'soc': None, 'confidence': None,
+                      'value': None, 'txHash': None},
+        })
+    return rows
+
+
+def _csv_rows(n_rows: int, data_type: str, era: str, rng: random.Random):
+    header = ['id', 'era', 'data_type'] + \
+        ['feature{}'.format(i + 1) for i in range(N_FEATURES)] + ['target']
+    yield ','.join(header) + '\n'
+    for i in range(n_rows):
+        features = ','.join('{:.5f}'.format(rng.random()) for _ in range(N_FEATURES))
+        yield '{},{},{},{},{}\n'.format(i, era, data_type, features, rng.randint(0, 1))
+
+
+def make_dataset(n_rows: int, seed: int = 0) -> bytes:
+    """synthetic dataset zip laid out like the real one"""
+    rng = random.Random(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data_type, era in (('numerai_training_data.csv', 'train', 'era1'),
+                                     ('numerai_tournament_data.csv', 'validation', 'era97')):
+            content = ''.join(_csv_rows(n_rows, data_type, era, rng))
+            z.writestr('numerai_dataset/' + name, content)
+    return buf.getvalue()
+
+
+def write_predictions(tournament_path: str, path: str) -> None:
+    """write a valid predictions file for the ids of `tournament_path`"""
+    with open(tournament_path) as src, open(path, 'w') as dst:
+        next(src)
+        dst.write('id,probability\n')
+        for line in src:
+            dst.write(line.partition(',')[0] + ',0.5\n')
+
+
+class MockNumeraiServer(object):  # pylint: disable=too-many-instance-attributes
+    """threaded HTTP server serving synthetic Numerai responses
+
+    use as a context manager; `url` is the GraphQL endpoint to hand to
+    `NumerApiManager`. `delay` seconds are added to every GraphQL response;
+    the next GraphQL requests are additionally held for the seconds popped
+    from the front of `stalls`.
+    `max_in_flight` is the most GraphQL requests handled at once.
+    With `persisted_queries` the server accepts automatic persisted queries
+    and counts requests answered from a hash alone in `persisted_hits`.
+    """
+
+    def __init__(self, leaderboard_size: int = 1000, dataset_rows: int = 1000,
+                 host: str = '127.0.0.1', port: int = 0, delay: float = 0,
+                 persisted_queries: bool = False):
+        self.delay = delay
+        self.stalls = []
+        self.persisted_queries = persisted_queries
+        self.persisted = {}
+        self.persisted_hits = 0
+        self.leaderboard = make_leaderboard(leaderboard_size)
+        self.dataset = make_dataset(dataset_rows)
+        self.uploads = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return 'http://{}:{}{}'.format(host, port, GRAPHQL_PATH)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def pop_stall(self) -> float:
+        with self._lock:
+            return self.stalls.pop(0) if self.stalls else 0
+
+    def _resolve_persisted(self, body: dict):
+        """query text of the request, or an error response"""
+        persisted = (body.get('extensions') or {}).get('persistedQuery')
+        if persisted is None:
+            return body.get('query', ''), None
+        if not self.persisted_queries:
+            return None, {'errors': [{'message': 'PersistedQueryNotSupported',
+                                      'extensions': {'code': 'PERSISTED_QUERY_NOT_SUPPORTED'}}]}
+        digest = persisted['sha256Hash']
+        if 'query' in body:
+            if hashlib.sha256(body['query'].encode('utf-8')).hexdigest() != digest:
+                return None, {'errors': [{'message': 'provided sha does not match query'}]}
+            self.persisted[digest] = body['query']
+            return body['query'], None
+        if digest not in self.persisted:
+            return None, {'errors': [{'message': 'PersistedQueryNotFound',
+                                      'extensions': {'code': 'PERSISTED_QUERY_NOT_FOUND'}}]}
+        with self._lock:
+            self.persisted_hits += 1
+        return self.persisted[digest], None
+
+    def graphql(self, body: dict) -> dict:  # pylint: disable=too-many-return-statements
+        query, error = self._resolve_persisted(body)
+        if error is not None:
+            return error
+        base = self.url.rstrip('/')
+        if 'submission_upload_auth' in query:
+            filename = body['variables']['filename']
+            return {'data': {'submission_upload_auth': {
+                'filename': filename, 'url': base + UPLOAD_PATH}}}
+        if 'create_submission' in query:
+            return {'data': {'create_submission': {'id': str(uuid.uuid4())}}}
+        if 'submissions' in query:
+            return {'data': {'submissions': [{
+                'originality': {'pending': False, 'value': True},
+                'concordance': {'pending': False, 'value': True},
+                'consistency': 75, 'validation_logloss': 0.69}]}}
+        if 'dataset' in query and 'rounds' not in query:
+            return {'data': {'dataset': base + DATASET_PATH}}
+        if 'leaderboard' in query:
+            return {'data': {'rounds': [{'leaderboard': self.leaderboard}]}}
+        if 'resolveTime' in query:
+            return {'data': {'rounds': [
+                {'number': n, 'resolveTime': '2018-01-01T00:00:00Z',
+                 'datasetId': str(n), 'openTime': '2017-12-25T00:00:00Z',
+                 'resolvedGeneral': n < 90, 'resolvedStaking': n < 90}
+                for n in range(1, 91)]}}
+        if 'rounds' in query:
+            return {'data': {'rounds': [{'number': 90}]}}
+        return {'errors': [{'message': 'unsupported query'}]}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, avoid delayed ACK stalls
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get('Content-Length', 0))
+                return self.rfile.read(length)
+
+            def _send(self, status: int, payload: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                server.count_request()
+                with server._lock:  # pylint: disable=protected-access
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                try:
+                    if server.delay:
+                        time.sleep(server.delay)
+                    stall = server.pop_stall()
+                    if stall:
+                        time.sleep(stall)
+                    result = server.graphql(json.loads(self._read_body().decode('utf-8')))
+                finally:
+                    with server._lock:  # pylint: disable=protected-access
+                        server.in_flight -= 1
+                self._send(200, json.dumps(result).encode('utf-8'), 'application/json')
+
+            def do_GET(self):
+                server.count_request()
+                if self.path == DATASET_PATH:
+                    self._send(200, server.dataset, 'application/zip')
+                else:
+                    self._send(404, b'', 'text/plain')
+
+            def do_PUT(self):
+                server.count_request()
+                server.uploads.append(len(self._read_body()))
+                self._send(200, b'', 'text/plain')
+
+        return Handler
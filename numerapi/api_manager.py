@@ -1,21 +1,105 @@
+import contextlib
+import contextvars
+import copy
+import json
 import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from typing import Union
 
-import requests
 from zope.interface import implementer
 
+from numerapi import deadline, queries
+from numerapi.cache import cache_key
 from numerapi.manager import IManager
+from numerapi.memprofile import track
+from numerapi.singleflight import SingleFlight
+from numerapi.validation import validate_predictions
 
 API_TOURNAMENT_URL = 'https://api-tournament.numer.ai'
+PERSISTED_QUERY_NOT_FOUND = 'PERSISTED_QUERY_NOT_FOUND'
+PERSISTED_QUERY_NOT_SUPPORTED = 'PERSISTED_QUERY_NOT_SUPPORTED'
+# latencies kept to derive the hedging delay from, and how many are needed
+HEDGE_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = 1.0
+# threads sending hedged requests, shared by a manager and its views
+HEDGE_WORKERS = 32
+# threads running `raw_query_async` requests, unless the transport sets
+# `max_streams`
+ASYNC_WORKERS = 64
 
 
 @implementer(IManager)
-class NumerApiManager(object):
-    def __init__(self, api_url: str = API_TOURNAMENT_URL):
+class NumerApiManager(object):  # pylint: disable=too-many-instance-attributes
+    def __init__(self, api_url: str = API_TOURNAMENT_URL, session=None,  # pylint: disable=too-many-arguments
+                 coalesce: bool = True, transport=None, persisted_queries: bool = False,
+                 cache=None, cache_ttl: float = 60, timeout: float = 60,
+                 hedge: bool = False, hedge_after: float = None):
+        """
+        api_url: GraphQL endpoint
+        session: `requests.Session` to send requests with, allows several
+            managers to share one connection pool (optional)
+        coalesce: share one request between identical concurrent queries
+        transport: object with a `post(url, json=, headers=, timeout=)` method to send
+            GraphQL queries with instead of the session, e.g. an
+            `http2.Http2Transport` (optional); downloads and uploads always
+            go through the session
+        persisted_queries: send only the SHA-256 hash of a query document
+            (automatic persisted queries) and the document itself only when
+            the server asks for it; turned off automatically if the server
+            does not support it
+        cache: `cache.MemoryCache`, `cache.FileCache`, `cache.RedisCache` or
+            another object with `get(key)` and `set(key, value, ttl)` to share
+            results of queries without authorization (optional)
+        cache_ttl: seconds a cached result is used
+        timeout: seconds to wait for a response or the next chunk of one,
+            None to wait forever; `deadline.deadline` caps it further
+        hedge: send a second copy of a query that is not answered after
+            `hedge_after` seconds and use the first response; mutations are
+            never hedged
+        hedge_after: fixed hedging delay, defaults to the 95th percentile of
+            recent query latencies
+        """
         self.api_url = api_url
         self.token = None
+        self.coalesce = coalesce
+        self.transport = transport
+        self.persisted_queries = persisted_queries
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        # queries sent a second time, in a list to share it with the views
+        self._hedges = [0]
+        self._latencies = deque(maxlen=HEDGE_SAMPLES)
+        self._hedge_lock = threading.Lock()
+        # name -> thread pool, shared with the views from `with_token`
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+        # `memprofile.MemoryProfiler`, set by `NumerAPI(profiler=...)`
+        self.profiler = None
         self.logger = logging.getLogger(__name__)
+        self._session = session
+        self._flight = SingleFlight()
+
+    @property
+    def hedges(self) -> int:
+        """number of queries that were sent a second time, by this manager
+        and its views"""
+        return self._hedges[0]
+
+    @property
+    def session(self):
+        """shared `requests.Session`, created on first use"""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
 
     def _handle_call_error(self, errors) -> Union[None, str]:
         msg = None
@@ -33,278 +117,106 @@ class NumerApiManager(object):
     def set_token(self, token: tuple):
         self.token = token
 
+    def with_token(self, token: tuple) -> 'NumerApiManager':
+        """view of this manager that authorizes with `token`
+
+        the view shares the session, the transport and in-flight queries with
+        this manager; setting the token of one does not affect the other
+        """
+        view = copy.copy(self)
+        view._session = self.session  # pylint: disable=protected-access
+        view.token = token
+        return view
+
     def download_data_set(self, dataset_path: str) -> None:
         url = self.get_link_to_current_dataset()
 
-        # download
-        dataset_res = requests.get(url, stream=True)
-        dataset_res.raise_for_status()
+        with track(self.profiler, 'download'), self._timeouts():
+            # download
+            dataset_res = self.session.get(url, stream=True,
+                                           timeout=deadline.timeout(self.timeout))
+            dataset_res.raise_for_status()
 
-        # write dataset to file
-        with open(dataset_path, "wb") as f:
-            for chunk in dataset_res.iter_content(1024):
-                f.write(chunk)
+            # write dataset to file
+            with open(dataset_path, "wb") as f:
+                for i, chunk in enumerate(dataset_res.iter_content(1024)):
+                    f.write(chunk)
+                    deadline.remaining()
+                    if self.profiler is not None and i % 1024 == 0:
+                        self.profiler.check('download')
 
     def get_current_round(self) -> dict:
         """get information about the current active round"""
         # zero is an alias for the current round!
-        query = '''
-            query {
-              rounds(number: 0) {
-                number
-              }
-            }
-        '''
+        query = queries.CURRENT_ROUND.text
         return self.raw_query(query)
 
     def get_submission_ids(self):
-        query = """
-            query {
-              rounds(number: 0) {
-                leaderboard {
-                  username
-                  submissionId
-                }
-            }
-        }
-        """
+        query = queries.SUBMISSION_IDS.text
         return self.raw_query(query)
 
     def get_competitions(self) -> dict:
-        query = '''
-            query {
-              rounds {
-                number
-                resolveTime
-                datasetId
-                openTime
-                resolvedGeneral
-                resolvedStaking
-              }
-            }
-        '''
+        query = queries.COMPETITIONS.text
         return self.raw_query(query)
 
     def get_submission(self, submission_id: str) -> dict:
-        query = '''
-            query($submission_id: String!) {
-              submissions(id: $submission_id) {
-                originality {
-                  pending
-                  value
-                }
-                concordance {
-                  pending
-                  value
-                }
-                consistency
-                validation_logloss
-              }
-            }
-            '''
+        query = queries.SUBMISSION.text
         variable = {'submission_id': submission_id}
         return self.raw_query(query, variable, authorization=True)
 
     def get_staking_leaderboard(self, round_num: int):
-        query = '''
-            query($number: Int!) {
-              rounds(number: $number) {
-                leaderboard {
-                  consistency
-                  liveLogloss
-                  username
-                  validationLogloss
-                  stake {
-                    insertedAt
-                    soc
-                    confidence
-                    value
-                    txHash
-                  }
-
-                }
-              }
-            }
-        '''
+        query = queries.STAKING_LEADERBOARD.text
         arguments = {'number': round_num}
         return self.raw_query(query, arguments)
 
     def get_link_to_current_dataset(self):
-        query = "query {dataset}"
+        query = queries.DATASET.text
         return self.raw_query(query)['data']['dataset']
 
-    def upload_predictions(self, file_path: str) -> dict:
-        auth_query = \
-            '''
-            query($filename: String!) {
-                submission_upload_auth(filename: $filename) {
-                    filename
-                    url
-                }
-            }
-            '''
+    def upload_predictions(self, file_path: str, tournament_data_path: str = None,
+                           data: bytes = None) -> dict:
+        if data is None:
+            with track(self.profiler, 'upload_read'), open(file_path, 'rb') as fh:
+                data = fh.read()
+        # fail before any request is made
+        validate_predictions(file_path, tournament_data_path, data)
+
+        auth_query = queries.SUBMISSION_UPLOAD_AUTH.text
         variable = {'filename': os.path.basename(file_path)}
         submission_resp = self.raw_query(auth_query, variable, authorization=True)
         submission_auth = submission_resp['data']['submission_upload_auth']
 
-        with open(file_path, 'rb') as fh:
-            requests.put(submission_auth['url'], data=fh.read())
-
-        create_query = \
-            '''
-            mutation($filename: String!) {
-                create_submission(filename: $filename) {
-                    id
-                }
-            }
-            '''
+        with self._timeouts():
+            self.session.put(submission_auth['url'], data=data,
+                             timeout=deadline.timeout(self.timeout))
+
+        create_query = queries.CREATE_SUBMISSION.text
         variables = {'filename': submission_auth['filename']}
         return self.raw_query(create_query, variables, authorization=True)
 
     def get_leaderboard(self, round_num: int) -> dict:
-        query = '''
-            query($number: Int!) {
-              rounds(number: $number) {
-                leaderboard {
-                  consistency
-                  concordance {
-                    pending
-                    value
-                  }
-                  originality {
-                    pending
-                    value
-                  }
-
-                  liveLogloss
-                  submissionId
-                  username
-                  validationLogloss
-                  paymentGeneral {
-                    nmrAmount
-                    usdAmount
-                  }
-                  paymentStaking {
-                    nmrAmount
-                    usdAmount
-                  }
-                  totalPayments {
-                    nmrAmount
-                    usdAmount
-                  }
-                }
-              }
-            }
-        '''
+        query = queries.LEADERBOARD.text
         arguments = {'number': round_num}
         return self.raw_query(query, arguments)
 
     def get_payments(self):
         """all your payments"""
-        query = """
-          query {
-            user {
-              payments {
-                nmrAmount
-                round {
-                  number
-                  openTime
-                  resolveTime
-                  resolvedGeneral
-                  resolvedStaking
-                }
-                tournament
-                usdAmount
-              }
-
-            }
-          }
-        """
+        query = queries.PAYMENTS.text
         return self.raw_query(query, authorization=True)
 
     def get_transactions(self):
         """all deposits and withdrawals"""
-        query = """
-          query {
-            user {
-
-              nmrDeposits {
-                from
-                id
-                posted
-                status
-                to
-                txHash
-                value
-              }
-              nmrWithdrawals {
-                from
-                id
-                posted
-                status
-                to
-                txHash
-                value
-              }
-              usdWithdrawals {
-                ethAmount
-                confirmTime
-                from
-                posted
-                sendTime
-                status
-                to
-                txHash
-                usdAmount
-              }
-            }
-          }
-        """
+        query = queries.TRANSACTIONS.text
         return self.raw_query(query, authorization=True)
 
     def get_stakes(self):
         """all your stakes"""
-        query = """
-          query {
-            user {
-              stakeTxs {
-                confidence
-                insertedAt
-                roundNumber
-                soc
-                staker
-                status
-                txHash
-                value
-              }
-            }
-          }
-        """
+        query = queries.STAKES.text
         return self.raw_query(query, authorization=True)
 
     def get_user(self):
         """get all information about you! """
-        query = """
-          query {
-            user {
-              username
-              banned
-              assignedEthAddress
-              availableNmr
-              availableUsd
-              email
-              id
-              mfaEnabled
-              status
-              insertedAt
-              apiTokens {
-                name
-                public_id
-                scopes
-              }
-            }
-          }
-        """
+        query = queries.USER.text
         return self.raw_query(query, authorization=True)
 
     def raw_query(self, query, variables=None, authorization=False):
@@ -313,19 +225,177 @@ class NumerApiManager(object):
         query (str): the query
         variables (dict): dict of variables
         authorization (bool): does the request require authorization
+
+        identical queries (same document, variables and token) that are sent
+        concurrently share one request and its result; mutations are always
+        sent individually. Variables that do not match the variable
+        definitions of the query and authorized queries without a token
+        raise ValueError before a request is made.
         """
-        body = {'query': query,
-                'variables': variables}
+        self._validate(query, variables, authorization)
+        key = self._flight_key(query, variables, authorization)
+        if key is None:
+            return self._post(query, variables, authorization)
+        return self._flight.do(
+            key, lambda: self._post(query, variables, authorization))
+
+    async def raw_query_async(self, query, variables=None, authorization=False):
+        """asyncio version of `raw_query`, coalesced with concurrent coroutines
+        and threads
+
+        requests run in a thread pool of the transport's `max_streams` (or
+        `ASYNC_WORKERS`) threads that this manager and its views share
+        """
+        self._validate(query, variables, authorization)
+        key = self._flight_key(query, variables, authorization)
+        if key is None:
+            key = object()
+        # the executor does not carry the context, and with it the deadline
+        context = contextvars.copy_context()
+        workers = getattr(self.transport, 'max_streams', None) or ASYNC_WORKERS
+        return await self._flight.do_async(
+            key, lambda: context.run(self._post, query, variables, authorization),
+            executor=self._pool('async', workers))
+
+    def _pool(self, name: str, workers: int) -> ThreadPoolExecutor:
+        """thread pool `name`, created on first use"""
+        with self._pools_lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = self._pools[name] = ThreadPoolExecutor(
+                    workers, thread_name_prefix='numerapi-' + name)
+            return pool
+
+    def _validate(self, query, variables, authorization):
+        if authorization and not self.token:
+            raise ValueError('this query requires authorization, create the client '
+                             'with a public id and a secret key')
+        queries.check_variables(query, variables)
+
+    def _flight_key(self, query, variables, authorization):
+        if not self.coalesce or query.lstrip().startswith('mutation'):
+            return None
+        token = self.token if authorization else None
+        return query, json.dumps(variables, sort_keys=True), token
+
+    def _post(self, query, variables, authorization):
+        if self.cache is None or authorization or query.lstrip().startswith('mutation'):
+            return self._request(query, variables, authorization)
+        key = cache_key(queries.compile(query).text, variables)
+        try:
+            cached = self.cache.get(key)
+        except (OSError, ValueError) as err:
+            self.logger.warning('cache lookup failed: {}'.format(err))
+            cached = None
+        if cached is not None:
+            return json.loads(cached.decode('utf-8'))
+        result = self._request(query, variables, authorization)
+        try:
+            self.cache.set(key, json.dumps(result).encode('utf-8'), self.cache_ttl)
+        except (OSError, ValueError) as err:
+            self.logger.warning('cache update failed: {}'.format(err))
+        return result
+
+    def _request(self, query, variables, authorization):
+        compiled = queries.compile(query)
+        read_only = not compiled.text.startswith('mutation')
         headers = {'Content-type': 'application/json',
                    'Accept': 'application/json'}
         if authorization and self.token:
             public_id, secret_key = self.token
             headers['Authorization'] = \
                 'Token {}${}'.format(public_id, secret_key)
-        r = requests.post(self.api_url, json=body, headers=headers)
-        result = r.json()
+
+        body = {'query': compiled.text,
+                'variables': variables}
+        if self.persisted_queries:
+            # send the hash only; the server asks for the text if it does
+            # not know the hash yet
+            extensions = {'persistedQuery': {'version': 1, 'sha256Hash': compiled.sha256}}
+            result = self._send({'variables': variables, 'extensions': extensions}, headers,
+                                read_only)
+            error = _persisted_query_error(result)
+            if error is None:
+                return self._check(result)
+            if error == PERSISTED_QUERY_NOT_SUPPORTED:
+                self.logger.info('server does not support persisted queries')
+                self.persisted_queries = False
+            else:
+                body['extensions'] = extensions
+        return self._check(self._send(body, headers, read_only))
+
+    def _send(self, body, headers, read_only) -> dict:
+        with self._timeouts():
+            if not (self.hedge and read_only):
+                return self._send_once(body, headers)
+            return self._send_hedged(body, headers)
+
+    def _send_once(self, body, headers) -> dict:
+        start = time.monotonic()
+        r = (self.transport or self.session).post(
+            self.api_url, json=body, headers=headers, timeout=deadline.timeout(self.timeout))
+        with track(self.profiler, 'json_decode'):
+            result = r.json()
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    def _hedge_delay(self) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        latencies = sorted(self._latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return latencies[int(len(latencies) * 0.95)]
+
+    def _send_hedged(self, body, headers) -> dict:
+        pool = self._pool('hedge', HEDGE_WORKERS)
+        # each attempt runs in its own copy of the context, for the deadline
+        attempts = [pool.submit(
+            contextvars.copy_context().run, self._send_once, body, headers)]
+        done, _ = wait(attempts, timeout=self._hedge_delay())
+        if not done:
+            with self._hedge_lock:
+                self._hedges[0] += 1
+            attempts.append(pool.submit(
+                contextvars.copy_context().run, self._send_once, body, headers))
+        error = None
+        for future in as_completed(attempts):
+            try:
+                return future.result()
+            except Exception as err:  # pylint: disable=broad-except
+                error = error or err
+        raise error
+
+    @contextlib.contextmanager
+    def _timeouts(self):
+        """raise TimeoutError for failures once the deadline has passed"""
+        try:
+            yield
+        except TimeoutError:
+            raise
+        except Exception as err:
+            if deadline.expired():
+                raise TimeoutError('deadline exceeded') from err
+            raise
+
+    def _check(self, result: dict) -> dict:
         if "errors" in result:
             error_msg = self._handle_call_error(result['errors'])
             raise ValueError(error_msg or 'unknown error')
 
         return result
+
+
+def _persisted_query_error(result: dict) -> Union[None, str]:
+    """PERSISTED_QUERY_NOT_FOUND or _NOT_SUPPORTED if the server sent it"""
+    for error in result.get('errors') or ():
+        if not isinstance(error, dict):
+            continue
+        code = (error.get('extensions') or {}).get('code')
+        if code in (PERSISTED_QUERY_NOT_FOUND, PERSISTED_QUERY_NOT_SUPPORTED):
+            return code
+        if error.get('message') == 'PersistedQueryNotFound':
+            return PERSISTED_QUERY_NOT_FOUND
+        if error.get('message') == 'PersistedQueryNotSupported':
+            return PERSISTED_QUERY_NOT_SUPPORTED
+    return None
@@ -0,0 +1,163 @@
+"""shared caches for query results
+
+`NumerApiManager(cache=...)` looks up the results of queries that need no
+authorization in a cache before sending them and stores what it fetched for
+`cache_ttl` seconds. A cache is any object with
+
+    get(key: str) -> bytes or None
+    set(key: str, value: bytes, ttl: float) -> None
+
+`MemoryCache` is shared by the managers of one process, `FileCache` by the
+processes of one host and `RedisCache` by a whole fleet of workers.
+"""
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+def cache_key(query: str, variables) -> str:
+    """key of a query document (as sent) and its variables"""
+    data = json.dumps([query, variables], sort_keys=True).encode('utf-8')
+    return 'numerapi:' + hashlib.sha256(data).hexdigest()
+
+
+class MemoryCache(object):
+    """cache in the memory of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._items[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._items[key] = (time.time() + ttl, value)
+
+
+class FileCache(object):
+    """cache in a local directory, one file per key
+
+    files are replaced atomically, so processes sharing the directory never
+    read partial entries
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'rb') as fh:
+                expires = float(fh.readline())
+                if expires < time.time():
+                    return None
+                return fh.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        path = self._path(key)
+        tmp = '{}.{}.tmp'.format(path, uuid.uuid4().hex)
+        with open(tmp, 'wb') as fh:
+            fh.write('{!r}\n'.format(time.time() + ttl).encode('ascii'))
+            fh.write(value)
+        os.replace(tmp, path)
+
+
+class RedisCache(object):
+    """cache in a Redis (or protocol compatible) server
+
+    only GET and SET with an expiry are used, spoken directly over the
+    socket; each thread keeps its own connection.
+
+    host, port: address of the server
+    db: database number selected on connect
+    timeout: seconds to wait for connecting and for each reply
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0,
+                 timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self._local.conn = (sock, sock.makefile('rb'))
+            if self.db:
+                self._command('SELECT', str(self.db))
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        try:
+            sock.sendall(b''.join(parts))
+            return _read_reply(reader)
+        except OSError:
+            self.close()
+            raise
+
+    def get(self, key: str):
+        return self._command('GET', key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._command('SET', key, value, 'PX', str(max(1, int(ttl * 1000))))
+
+    def close(self):
+        """close the connection of the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn[1].close()
+            conn[0].close()
+
+
+def _read_reply(reader):
+    line = reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('connection to the cache server closed')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode('utf-8')
+    if kind == b'-':
+        raise ValueError('cache server error: {}'.format(rest.decode('utf-8')))
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError('connection to the cache server closed')
+        return data[:-2]
+    if kind == b'*':
+        return [_read_reply(reader) for _ in range(int(rest))]
+    raise ValueError('unexpected reply from the cache server: {!r}'.format(line))
@@ -0,0 +1,97 @@
+"""incremental diffing of leaderboards during a live round
+
+`LeaderboardFeed` keeps the last fetched leaderboard as one tuple of tracked
+values per `submissionId` (the `username` for rows without a submission)
+and reports only the rows that were inserted,
+updated or removed since the previous fetch.
+"""
+import time
+from collections import namedtuple
+
+DEFAULT_FIELDS = ('liveLogloss', 'validationLogloss', 'consistency',
+                  'concordance.pending', 'concordance.value',
+                  'originality.pending', 'originality.value')
+
+INSERT = 'insert'
+UPDATE = 'update'
+REMOVE = 'remove'
+
+# kind: one of INSERT, UPDATE, REMOVE
+# submission_id: key of the row, its `submissionId` or else its `username`
+# row: the new leaderboard row, None for removals
+# fields: for updates a dict field -> (old value, new value), else None
+LeaderboardChange = namedtuple('LeaderboardChange', ['kind', 'submission_id', 'row', 'fields'])
+
+
+def _getter(field: str):
+    path = field.split('.')
+
+    def get(row):
+        for key in path:
+            if row is None:
+                return None
+            row = row.get(key)
+        return row
+    return get
+
+
+class LeaderboardFeed(object):
+    """change feed over `NumerAPI.get_leaderboard`
+
+    api: `NumerAPI` instance used for fetching
+    round_num: round to follow, defaults to the current round
+    fields: dotted names of the values to compare, defaults to
+        `DEFAULT_FIELDS`
+    """
+
+    def __init__(self, api, round_num: int = 0, fields=DEFAULT_FIELDS):
+        self.api = api
+        self.round_num = round_num
+        self.fields = tuple(fields)
+        self._getters = [_getter(field) for field in self.fields]
+        self._snapshot = {}
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def _key(self, row) -> tuple:
+        return tuple(get(row) for get in self._getters)
+
+    def update(self, rows: list) -> list:
+        """diff `rows` against the snapshot, store them and return the changes
+
+        rows with neither a `submissionId` nor a `username` are skipped
+        """
+        new = {}
+        for row in rows:
+            key = row.get('submissionId') or row.get('username')
+            if key is not None:
+                new[key] = row
+        old = self._snapshot
+        snapshot = {}
+        changes = []
+        for submission_id, row in new.items():
+            values = self._key(row)
+            snapshot[submission_id] = values
+            previous = old.get(submission_id)
+            if previous is None:
+                changes.append(LeaderboardChange(INSERT, submission_id, row, None))
+            elif previous != values:
+                diff = {field: (before, after)
+                        for field, before, after in zip(self.fields, previous, values)
+                        if before != after}
+                changes.append(LeaderboardChange(UPDATE, submission_id, row, diff))
+        for submission_id in old.keys() - new.keys():
+            changes.append(LeaderboardChange(REMOVE, submission_id, None, None))
+        self._snapshot = snapshot
+        return changes
+
+    def poll(self) -> list:
+        """fetch the leaderboard once and return the changes"""
+        return self.update(self.api.get_leaderboard(self.round_num))
+
+    def follow(self, interval: float = 300):
+        """poll every `interval` seconds and yield changes as they happen"""
+        while True:
+            yield from self.poll()
+            time.sleep(interval)
@@ -0,0 +1,379 @@
+"""command line interface to the Numerai API
+
+Batch arguments (several rounds, several accounts from a config file) are run
+concurrently in a thread pool on one shared connection pool. Results are
+streamed as they arrive, as NDJSON (default), CSV or Parquet.
+
+The accounts config file is in INI format, one section per account:
+
+    [myaccount]
+    public_id = ...
+    secret_key = ...
+    predictions = path/to/predictions.csv  ; optional, used by `submit`
+"""
+import argparse
+import configparser
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from numerapi.numerapi import NumerAPI
+from numerapi.utils import flatten
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+
+class NdjsonWriter(object):
+    def __init__(self, fh):
+        self.fh = fh
+
+    def write(self, records: list):
+        for record in records:
+            self.fh.write(json.dumps(record) + '\n')
+        self.fh.flush()
+
+    def close(self):
+        pass
+
+
+class CsvWriter(object):
+    """columns are taken from the first record; later unknown keys are dropped"""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self._writer = None
+
+    def write(self, records: list):
+        for record in records:
+            record = flatten(record)
+            if self._writer is None:
+                self._writer = csv.DictWriter(self.fh, fieldnames=list(record),
+                                              extrasaction='ignore')
+                self._writer.writeheader()
+            self._writer.writerow(record)
+        self.fh.flush()
+
+    def close(self):
+        pass
+
+
+class ParquetWriter(object):
+    """each batch of records becomes one row group; requires pyarrow
+
+    the file schema is inferred from the first records, held back until
+    every column has a concrete type (a live round has no `liveLogloss`
+    yet). Later batches are cast to it; a batch that cannot be cast
+    without loss raises ValueError.
+    """
+
+    def __init__(self, fh):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as err:
+            raise RuntimeError('parquet output requires pyarrow: pip install numerapi[parquet]') from err
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.fh = fh
+        self._writer = None
+        self._pending = []
+
+    def write(self, records: list):
+        rows = [flatten(r) for r in records]
+        if self._writer is None:
+            self._pending.extend(rows)
+            if not self._pending:
+                return
+            schema = self._pa.Table.from_pylist(self._pending).schema
+            if any(self._pa.types.is_null(field.type) for field in schema):
+                return
+            self._open(schema)
+        elif rows:
+            self._write(rows)
+
+    def _open(self, schema):
+        self._writer = self._pq.ParquetWriter(self.fh, schema)
+        rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def _write(self, rows: list):
+        pa = self._pa
+        schema = self._writer.schema
+        table = pa.Table.from_pylist(rows)
+        columns = []
+        try:
+            for field in schema:
+                if field.name in table.column_names:
+                    columns.append(table.column(field.name).cast(field.type))
+                else:
+                    columns.append(pa.nulls(len(rows), field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as err:
+            raise ValueError('records do not fit the parquet schema: {}'.format(err)) from err
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+    def close(self):
+        if self._writer is None and self._pending:
+            self._open(self._pa.Table.from_pylist(self._pending).schema)
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+def load_accounts(args) -> list:
+    """list of (name, public_id, secret_key, options) for the selected accounts"""
+    if args.config:
+        parser = configparser.ConfigParser()
+        if not parser.read(args.config):
+            raise ValueError('cannot read config file %s' % args.config)
+        names = args.account or parser.sections()
+        accounts = []
+        for name in names:
+            if not parser.has_section(name):
+                raise ValueError('no account "%s" in %s' % (name, args.config))
+            section = dict(parser.items(name))
+            accounts.append((name, section.get('public_id'),
+                             section.get('secret_key'), section))
+        return accounts
+    public_id = args.public_id or os.environ.get('NUMERAI_PUBLIC_ID')
+    secret_key = args.secret_key or os.environ.get('NUMERAI_SECRET_KEY')
+    return [('default', public_id, secret_key, {})]
+
+
+class Runner(object):
+    """creates clients that share one connection pool and runs tasks"""
+
+    def __init__(self, args):
+        self.args = args
+        self._api = None
+        self._lock = threading.Lock()
+
+    @property
+    def api(self) -> NumerAPI:
+        """client without credentials, all clients share its manager"""
+        with self._lock:
+            if self._api is None:
+                import requests
+                from numerapi.api_manager import NumerApiManager, API_TOURNAMENT_URL
+
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.args.jobs)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                manager = NumerApiManager(self.args.api_url or API_TOURNAMENT_URL,
+                                          session=session)
+                self._api = NumerAPI(verbosity=self.args.verbosity, manager=manager)
+        return self._api
+
+    def client(self, public_id=None, secret_key=None) -> NumerAPI:
+        if public_id and secret_key:
+            return self.api.for_account(public_id, secret_key)
+        return self.api
+
+    def run(self, func, items):
+        """apply `func` to all items concurrently, yield results in order"""
+        with ThreadPoolExecutor(max_workers=self.args.jobs) as pool:
+            yield from pool.map(func, items)
+
+
+def cmd_download(runner: Runner, args):
+    api = runner.client()
+    path = api.download_current_dataset(dest_path=args.dest_path,
+                                        dest_filename=args.dest_filename,
+                                        unzip=not args.no_unzip)
+    yield [{'path': path}]
+
+
+def cmd_leaderboard(runner: Runner, args):
+    api = runner.client()
+
+    def fetch(round_num):
+        if args.staking:
+            rows = api.get_staking_leaderboard(round_num)
+        else:
+            rows = api.get_leaderboard(round_num)
+        return [dict(row, round=round_num) for row in rows]
+    return runner.run(fetch, args.rounds or [0])
+
+
+def cmd_competitions(runner: Runner, _):
+    yield runner.client().get_competitions()
+
+
+def cmd_submit(runner: Runner, args):
+    def submit(account):
+        name, public_id, secret_key, options = account
+        path = options.get('predictions') or args.file
+        if path is None:
+            raise ValueError('no predictions file given for account "%s"' % name)
+        submission_id = runner.client(public_id, secret_key).upload_predictions(path)
+        return [{'account': name, 'file': path, 'submission_id': submission_id}]
+    return runner.run(submit, load_accounts(args))
+
+
+def status_jobs(accounts: list, submission_ids: list) -> list:
+    """(account, submission id) pairs, each id with the account it belongs to
+
+    ids are given as "ACCOUNT:ID"; a bare id needs exactly one selected account
+    """
+    by_name = {account[0]: account for account in accounts}
+    jobs = []
+    for value in submission_ids:
+        name, _, submission_id = value.rpartition(':')
+        if name:
+            if name not in by_name:
+                raise ValueError('no account "%s" for submission %s' % (name, submission_id))
+            jobs.append((by_name[name], submission_id))
+        elif len(accounts) == 1:
+            jobs.append((accounts[0], submission_id))
+        else:
+            raise ValueError('give submission %s as ACCOUNT:ID, %d accounts are selected'
+                             % (submission_id, len(accounts)))
+    return jobs
+
+
+def cmd_status(runner: Runner, args):
+    jobs = status_jobs(load_accounts(args), args.submission_ids)
+
+    def status(job):
+        (name, public_id, secret_key, _), submission_id = job
+        result = runner.client(public_id, secret_key).submission_status(submission_id)
+        return [dict(result, account=name, submission_id=submission_id)]
+    return runner.run(status, jobs)
+
+
+def cmd_stakes(runner: Runner, args):
+    def stakes(account):
+        name, public_id, secret_key, _ = account
+        rows = runner.client(public_id, secret_key).get_stakes()
+        return [dict(row, account=name) for row in rows]
+    return runner.run(stakes, load_accounts(args))
+
+
+def cmd_sync(runner: Runner, args):
+    """download the current dataset, leaderboards not yet stored and those of
+    unresolved rounds"""
+    api = runner.client()
+    os.makedirs(args.dest_path, exist_ok=True)
+    path = api.download_current_dataset(dest_path=args.dest_path)
+    yield [{'type': 'dataset', 'path': path}]
+
+    # resolved rounds no longer change and are stored once, open rounds are
+    # fetched again on every run
+    missing = []
+    for competition in api.get_competitions():
+        round_num = competition['number']
+        if round_num < args.since:
+            continue
+        target = os.path.join(args.dest_path, 'leaderboard_{}.{}'.format(round_num, args.format))
+        if not competition['resolvedGeneral'] or not os.path.exists(target):
+            missing.append((round_num, target))
+
+    def fetch(job):
+        round_num, target = job
+        rows = api.get_leaderboard(round_num)
+        tmp = target + '.part'
+        mode = ('wb', None) if args.format == 'parquet' else ('w', '')
+        with open(tmp, mode[0], newline=mode[1]) as fh:
+            writer = WRITERS[args.format](fh)
+            writer.write(rows)
+            writer.close()
+        os.replace(tmp, target)
+        return [{'type': 'leaderboard', 'round': round_num, 'path': target,
+                 'rows': len(rows)}]
+
+    yield from runner.run(fetch, missing)
+
+
+def add_account_arguments(parser):
+    parser.add_argument('--config', help='INI file with one section per account')
+    parser.add_argument('--account', action='append',
+                        help='account section to use, repeatable (default: all)')
+    parser.add_argument('--public-id', help='defaults to $NUMERAI_PUBLIC_ID')
+    parser.add_argument('--secret-key', help='defaults to $NUMERAI_SECRET_KEY')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='numerapi', description=__doc__.splitlines()[0])
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--output', '-o', help='output file (default: stdout)')
+    parser.add_argument('--jobs', '-j', type=int, default=8,
+                        help='number of concurrent requests')
+    parser.add_argument('--verbosity', default='WARNING')
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    sub = commands.add_parser('download', help='download the current dataset')
+    sub.add_argument('--dest-path', default='.')
+    sub.add_argument('--dest-filename')
+    sub.add_argument('--no-unzip', action='store_true')
+    sub.set_defaults(func=cmd_download)
+
+    sub = commands.add_parser('leaderboard', help='leaderboards of one or more rounds')
+    sub.add_argument('rounds', type=int, nargs='*', help='default: current round')
+    sub.add_argument('--staking', action='store_true',
+                     help='staking leaderboard instead')
+    sub.set_defaults(func=cmd_leaderboard)
+
+    sub = commands.add_parser('competitions', help='information about all rounds')
+    sub.set_defaults(func=cmd_competitions)
+
+    sub = commands.add_parser('submit', help='upload predictions for each account')
+    sub.add_argument('file', nargs='?',
+                     help="predictions file, unless set per account as 'predictions'")
+    add_account_arguments(sub)
+    sub.set_defaults(func=cmd_submit)
+
+    sub = commands.add_parser('status', help='status of submissions')
+    sub.add_argument('submission_ids', nargs='+', metavar='[ACCOUNT:]ID',
+                     help='submission id, prefixed with its account if several are selected')
+    add_account_arguments(sub)
+    sub.set_defaults(func=cmd_status)
+
+    sub = commands.add_parser('stakes', help='stakes of each account')
+    add_account_arguments(sub)
+    sub.set_defaults(func=cmd_stakes)
+
+    sub = commands.add_parser('sync', help='keep a local directory up to date')
+    sub.add_argument('dest_path')
+    sub.add_argument('--since', type=int, default=0,
+                     help='first round whose leaderboard is stored')
+    sub.set_defaults(func=cmd_sync)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+                        level=getattr(logging, args.verbosity.upper()))
+    runner = Runner(args)
+
+    binary = args.format == 'parquet'
+    if args.output:
+        # closed below, once the writer is done
+        out = open(args.output, 'wb' if binary else 'w',  # pylint: disable=consider-using-with
+                   newline=None if binary else '')
+    else:
+        out = sys.stdout.buffer if binary else sys.stdout
+    writer = WRITERS[args.format](out)
+    try:
+        for records in args.func(runner, args):
+            writer.write(records)
+    except ValueError as err:
+        logging.getLogger(__name__).error(err)
+        return 1
+    finally:
+        writer.close()
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Arrow record batches of leaderboards and rounds, for other processes
+
+`record_batch` turns the results of `get_leaderboard`, `get_staking_leaderboard`
+or `get_competitions` into one Arrow record batch, with nested dicts
+flattened to dotted column names as in the command line's Parquet output.
+The batch is passed on in the Arrow IPC stream format:
+
+* `write_stream` / `read_stream` to a file, a socket or any binary file
+  object. Files are memory-mapped for reading, so the columns of the returned
+  table point into the page cache instead of being copied.
+* `share` puts the stream into a `multiprocessing.shared_memory` block.
+  Consumers attach with the picklable `handle` and read the table straight
+  from the block.
+
+Requires pyarrow (`pip install numerapi[parquet]`).
+"""
+import socket
+
+from numerapi.utils import flatten
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as err:
+        raise RuntimeError('Arrow export requires pyarrow: pip install numerapi[parquet]') from err
+    return pyarrow
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError as err:  # python 3.7
+        raise RuntimeError('shared Arrow tables require Python 3.8 or later') from err
+    return shared_memory
+
+
+def record_batch(records: list):
+    """`pyarrow.RecordBatch` of `records`, nested dicts become dotted columns
+
+    column types are inferred; columns without any value have the null type
+    """
+    pa = _pyarrow()
+    return pa.RecordBatch.from_pylist([flatten(record) for record in records])
+
+
+def leaderboard_batch(api, round_num: int = 0):
+    """`record_batch` of `api.get_leaderboard(round_num)`"""
+    return record_batch(api.get_leaderboard(round_num))
+
+
+def competitions_batch(api):
+    """`record_batch` of `api.get_competitions()`"""
+    return record_batch(api.get_competitions())
+
+
+def _write(batch, sink):
+    pa = _pyarrow()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+
+
+def write_stream(batch, sink) -> int:
+    """write `batch` as an Arrow IPC stream, returns the number of bytes
+
+    sink: path, connected socket or binary file object
+    """
+    pa = _pyarrow()
+    size = stream_size(batch)
+    if isinstance(sink, str):
+        with pa.OSFile(sink, 'wb') as fh:
+            _write(batch, fh)
+    elif isinstance(sink, socket.socket):
+        with sink.makefile('wb') as fh:
+            _write(batch, fh)
+    else:
+        _write(batch, sink)
+    return size
+
+
+def read_stream(source):
+    """`pyarrow.Table` of an Arrow IPC stream
+
+    source: path (memory-mapped, not copied), connected socket, bytes-like
+        object or binary file object
+    """
+    pa = _pyarrow()
+    if isinstance(source, str):
+        source = pa.memory_map(source, 'r')
+    elif isinstance(source, socket.socket):
+        with source.makefile('rb') as fh:
+            return pa.ipc.open_stream(fh).read_all()
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        source = pa.py_buffer(source)
+    return pa.ipc.open_stream(source).read_all()
+
+
+def stream_size(batch) -> int:
+    """size of `batch` as an Arrow IPC stream, without writing it"""
+    pa = _pyarrow()
+    sink = pa.MockOutputStream()
+    _write(batch, sink)
+    return sink.size()
+
+
+class SharedBatchHandle(object):  # pylint: disable=too-few-public-methods
+    """picklable reference to a `SharedBatch`, pass it to other processes"""
+
+    def __init__(self, block_name: str, size: int):
+        self.block_name = block_name
+        self.size = size
+
+    def attach(self) -> 'SharedBatch':
+        """map the block into this process, the table is not copied"""
+        block = _shared_memory().SharedMemory(name=self.block_name)
+        return SharedBatch(self, block, owner=False)
+
+
+class SharedBatch(object):
+    """Arrow IPC stream in a shared memory block
+
+    `table` reads from the block and is only valid until `close`;
+    references to it must be dropped before, otherwise the block cannot be
+    unmapped. The process that shared the batch also frees the memory on
+    `close`, attached processes only unmap.
+    """
+
+    def __init__(self, handle: SharedBatchHandle, block, owner: bool):
+        self.handle = handle
+        self.owner = owner
+        self._block = block
+        self.table = read_stream(block.buf[:handle.size])
+
+    def close(self):
+        self.table = None
+        if self._block is not None:
+            self._block.close()
+            if self.owner:
+                self._block.unlink()
+            self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def share(batch) -> SharedBatch:
+    """copy `batch` as an Arrow IPC stream into a new shared memory block"""
+    pa = _pyarrow()
+    size = stream_size(batch)
+    block = _shared_memory().SharedMemory(create=True, size=size)
+    try:
+        buffer = pa.py_buffer(block.buf[:size])
+        _write(batch, pa.FixedSizeBufferWriter(buffer))
+        del buffer
+        return SharedBatch(SharedBatchHandle(block.name, size), block, owner=True)
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
@@ -0,0 +1,56 @@
+"""deadlines for everything numerapi does within a block
+
+    with deadline(30):
+        napi.get_leaderboard(80)
+        napi.upload_predictions("predictions.csv")
+
+Requests sent in the block wait at most for the time left and raise
+TimeoutError once it is used up. Deadlines nest, the earliest one applies.
+They are stored in a context variable and so follow asyncio tasks as well.
+"""
+import contextlib
+import contextvars
+import time
+
+_deadline = contextvars.ContextVar('numerapi_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """fail numerapi calls in the block that are not done after `seconds`"""
+    end = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        end = min(end, current)
+    token = _deadline.set(end)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """seconds left until the current deadline, None without a deadline
+
+    raises TimeoutError if the deadline has passed
+    """
+    end = _deadline.get()
+    if end is None:
+        return None
+    left = end - time.monotonic()
+    if left <= 0:
+        raise TimeoutError('deadline exceeded')
+    return left
+
+
+def expired() -> bool:
+    end = _deadline.get()
+    return end is not None and time.monotonic() >= end
+
+
+def timeout(default):
+    """timeout for a request: `default` (seconds or None), capped by the deadline"""
+    left = remaining()
+    if left is None:
+        return default
+    return left if default is None else min(default, left)
@@ -0,0 +1,224 @@
+"""per-era feature statistics of the training data, computed once
+
+`compute_stats` reads `numerai_training_data.csv` in byte ranges on several
+processes. Each process sums up counts, feature sums, squares and products
+with the target per era with numpy; the sums are combined into the mean and
+standard deviation of each feature and its correlation with the target in
+every era. The result is stored next to the extracted data as a compressed
+`.npz` file named after the dataset id, which `load_stats` reads back.
+
+Requires numpy (`pip install numerapi[scoring]`).
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from numerapi.numerapi import MEMBER_INDEX
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TRAINING_FILE = 'numerai_training_data.csv'
+# byte ranges smaller than this are not split further
+MIN_CHUNK = 1 << 20
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('feature statistics require numpy: pip install numerapi[scoring]')
+
+
+def dataset_id(unzip_path: str) -> str:
+    """id of the extracted training data
+
+    the CRC-32 and size recorded by `unzip_data_set`, or the size and
+    modification time of the file if there is no record
+    """
+    try:
+        with open(os.path.join(unzip_path, MEMBER_INDEX)) as fh:
+            for key in json.load(fh):
+                name, crc, size = key.rsplit(':', 2)
+                if name == TRAINING_FILE:
+                    return '{}-{}'.format(crc, size)
+    except (OSError, ValueError):
+        pass
+    stat = os.stat(os.path.join(unzip_path, TRAINING_FILE))
+    return '{}-{}'.format(stat.st_size, stat.st_mtime_ns)
+
+
+def stats_path(unzip_path: str, dataset: str) -> str:
+    return os.path.join(unzip_path, 'feature_stats_{}.npz'.format(dataset))
+
+
+class FeatureStats(object):  # pylint: disable=too-many-instance-attributes
+    """statistics of each feature per era
+
+    eras: era names, the row order of all arrays
+    features: feature names, the column order of all arrays
+    counts: rows per era
+    mean, std, target_corr: float32 arrays of eras x features; the
+        correlation is NaN where feature or target are constant
+    """
+
+    def __init__(self, dataset: str, eras, features, counts, mean, std, target_corr):
+        self.dataset_id = dataset
+        self.eras = list(eras)
+        self.features = list(features)
+        self.counts = counts
+        self.mean = mean
+        self.std = std
+        self.target_corr = target_corr
+        self._era_index = {name: i for i, name in enumerate(self.eras)}
+        self._feature_index = {name: i for i, name in enumerate(self.features)}
+
+    def era(self, name: str) -> dict:
+        """feature -> (mean, std, target correlation) in era `name`"""
+        i = self._era_index[name]
+        return {feature: (float(self.mean[i, j]), float(self.std[i, j]),
+                          float(self.target_corr[i, j]))
+                for j, feature in enumerate(self.features)}
+
+    def feature(self, name: str) -> dict:
+        """"mean", "std" and "target_corr" of feature `name`, one value per era"""
+        j = self._feature_index[name]
+        return {'mean': self.mean[:, j], 'std': self.std[:, j],
+                'target_corr': self.target_corr[:, j]}
+
+    def save(self, path: str):
+        tmp = path + '.part'
+        with open(tmp, 'wb') as fh:
+            np.savez_compressed(fh, dataset_id=np.array(self.dataset_id),
+                                eras=np.array(self.eras), features=np.array(self.features),
+                                counts=self.counts, mean=self.mean, std=self.std,
+                                target_corr=self.target_corr)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeatureStats':
+        _require_numpy()
+        with np.load(path) as data:
+            return cls(str(data['dataset_id']), data['eras'].tolist(),
+                       data['features'].tolist(), data['counts'], data['mean'],
+                       data['std'], data['target_corr'])
+
+
+def _chunks(path: str, header_length: int, n_chunks: int) -> list:
+    size = os.path.getsize(path)
+    step = max(MIN_CHUNK, -(-(size - header_length) // n_chunks))
+    return [(start, min(start + step, size)) for start in range(header_length, size, step)]
+
+
+def _read_range(path: str, start: int, end: int):
+    """feature names, era names, era codes and feature + target values of
+    the rows starting in [start, end)"""
+    with open(path, 'rb') as fh:
+        header = fh.readline().decode('utf-8').strip().split(',')
+        era_col, target_col = header.index('era'), header.index('target')
+        feature_cols = [i for i, name in enumerate(header) if name.startswith('feature')]
+        # a line that starts before `start` belongs to the previous range
+        fh.seek(start - 1)
+        fh.readline()
+        names, codes, rows = {}, [], []
+        while fh.tell() < end:
+            line = fh.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            fields = line.decode('utf-8').rstrip('\r\n').split(',')
+            codes.append(names.setdefault(fields[era_col], len(names)))
+            rows.append([fields[i] for i in feature_cols] + [fields[target_col]])
+    return [header[i] for i in feature_cols], names, codes, rows
+
+
+def _partial_sums(path: str, start: int, end: int):
+    """era names and per-era sums of the rows starting in [start, end)"""
+    features, names, codes, rows = _read_range(path, start, end)
+    codes = np.asarray(codes, dtype=np.int64)
+    values = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(features) + 1)
+    x, y = values[:, :-1], values[:, -1]
+    n_eras = len(names)
+
+    def per_era(weights):
+        return np.bincount(codes, weights=weights, minlength=n_eras)
+
+    def per_era_columns(weights):
+        return np.stack([per_era(column) for column in weights.T], axis=1)
+
+    # dicts keep the order of first appearance
+    return (list(names), per_era(None).astype(np.float64), per_era_columns(x),
+            per_era_columns(x * x), per_era_columns(x * y[:, None]), per_era(y), per_era(y * y),
+            features)
+
+
+def _merge(parts: list):
+    """eras in order of first appearance in the file, feature names and the
+    summed totals of the parts"""
+    eras = []
+    for part in parts:
+        eras.extend(name for name in part[0] if name not in eras)
+    index = {name: i for i, name in enumerate(eras)}
+    features = parts[0][-1] if parts else []
+    totals = [np.zeros(len(eras)), np.zeros((len(eras), len(features))),
+              np.zeros((len(eras), len(features))), np.zeros((len(eras), len(features))),
+              np.zeros(len(eras)), np.zeros(len(eras))]
+    for part in parts:
+        rows = [index[name] for name in part[0]]
+        for total, partial in zip(totals, part[1:7]):
+            total[rows] += partial
+    return eras, features, totals
+
+
+def _moments(totals: list):
+    """counts, mean, std and target correlation from the summed totals"""
+    n, sx, sxx, sxy, sy, syy = totals
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sx / n[:, None]
+        var = np.maximum(sxx / n[:, None] - mean ** 2, 0)
+        y_mean = sy / n
+        y_var = np.maximum(syy / n - y_mean ** 2, 0)
+        cov = sxy / n[:, None] - mean * y_mean[:, None]
+        corr = cov / np.sqrt(var * y_var[:, None])
+        corr[~np.isfinite(corr)] = np.nan
+    return (n.astype(np.int64), mean.astype(np.float32), np.sqrt(var).astype(np.float32),
+            corr.astype(np.float32))
+
+
+def compute_stats(unzip_path: str, processes: int = None, save: bool = True) -> FeatureStats:
+    """compute the statistics of the extracted training data
+
+    unzip_path: directory with the files written by `unzip_data_set`
+    processes: number of worker processes, defaults to the number of CPUs
+    save: store the result next to the data for `load_stats`
+    """
+    _require_numpy()
+    path = os.path.join(unzip_path, TRAINING_FILE)
+    with open(path, 'rb') as fh:
+        header_length = len(fh.readline())
+    processes = processes or os.cpu_count() or 1
+    chunks = _chunks(path, header_length, processes * 4)
+
+    with ProcessPoolExecutor(processes) as pool:
+        parts = list(pool.map(_partial_sums, [path] * len(chunks),
+                              [start for start, _ in chunks], [end for _, end in chunks]))
+
+    eras, features, totals = _merge(parts)
+    stats = FeatureStats(dataset_id(unzip_path), eras, features, *_moments(totals))
+    if save:
+        stats.save(stats_path(unzip_path, stats.dataset_id))
+    return stats
+
+
+def load_stats(unzip_path: str, dataset: str = None, compute: bool = False) -> FeatureStats:
+    """statistics stored by `compute_stats` for the data in `unzip_path`
+
+    dataset: dataset id, defaults to the id of the extracted training data
+    compute: compute and store them if they are missing
+    """
+    _require_numpy()
+    path = stats_path(unzip_path, dataset or dataset_id(unzip_path))
+    if not os.path.exists(path) and compute:
+        return compute_stats(unzip_path)
+    return FeatureStats.load(path)
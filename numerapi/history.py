@@ -0,0 +1,304 @@
+"""incremental export of account history into a local columnar store
+
+`HistoryExporter` flattens the nested results of `get_payments`,
+`get_transactions` and `get_stakes` into typed tables and appends only
+records that are not in the store yet. Each table is a directory of Parquet
+files; every export run that finds new records adds one file. The keys of
+all stored records are kept in a `keys.json` index next to the files, so a
+run reads only the index, not the stored records. Once more than
+`COMPACT_PARTS` small files have piled up they are merged into one.
+
+Records are stored once, as first seen: later changes of e.g. `status` or
+`posted` are not picked up. Records without a key yet (pending USD
+withdrawals have no `txHash`) are skipped until the key is known.
+
+Requires pyarrow (`pip install numerapi[parquet]`).
+"""
+import datetime
+import decimal
+import json
+import os
+import uuid
+from collections import namedtuple
+
+from numerapi.locking import file_lock
+
+AMOUNT = 'amount'
+TIME = 'time'
+# per table: stored part files and keys of their records
+KEY_INDEX = 'keys.json'
+# parts smaller than COMPACT_SIZE bytes are merged once there are more than
+# COMPACT_PARTS of them after the last large part
+COMPACT_PARTS = 16
+COMPACT_SIZE = 4 << 20
+
+# name: column in the store
+# path: dotted path of the value in the API record
+# kind: one of AMOUNT, TIME, 'int', 'bool', 'str'
+Column = namedtuple('Column', ['name', 'path', 'kind'])
+
+_TRANSFER_COLUMNS = (
+    Column('id', 'id', 'str'),
+    Column('tx_hash', 'txHash', 'str'),
+    Column('from', 'from', 'str'),
+    Column('to', 'to', 'str'),
+    Column('posted', 'posted', 'bool'),
+    Column('status', 'status', 'str'),
+    Column('value', 'value', AMOUNT),
+)
+
+# table name -> (columns, key columns)
+TABLES = {
+    'payments': ((
+        Column('round_number', 'round.number', 'int'),
+        Column('tournament', 'tournament', 'str'),
+        Column('nmr_amount', 'nmrAmount', AMOUNT),
+        Column('usd_amount', 'usdAmount', AMOUNT),
+        Column('round_open_time', 'round.openTime', TIME),
+        Column('round_resolve_time', 'round.resolveTime', TIME),
+        Column('resolved_general', 'round.resolvedGeneral', 'bool'),
+        Column('resolved_staking', 'round.resolvedStaking', 'bool'),
+    ), ('round_number', 'tournament')),
+    'nmr_deposits': (_TRANSFER_COLUMNS, ('id',)),
+    'nmr_withdrawals': (_TRANSFER_COLUMNS, ('id',)),
+    'usd_withdrawals': ((
+        Column('tx_hash', 'txHash', 'str'),
+        Column('from', 'from', 'str'),
+        Column('to', 'to', 'str'),
+        Column('posted', 'posted', 'bool'),
+        Column('status', 'status', 'str'),
+        Column('eth_amount', 'ethAmount', AMOUNT),
+        Column('usd_amount', 'usdAmount', AMOUNT),
+        Column('send_time', 'sendTime', TIME),
+        Column('confirm_time', 'confirmTime', TIME),
+    ), ('tx_hash',)),
+    'stakes': ((
+        Column('tx_hash', 'txHash', 'str'),
+        Column('round_number', 'roundNumber', 'int'),
+        Column('staker', 'staker', 'str'),
+        Column('status', 'status', 'str'),
+        Column('confidence', 'confidence', AMOUNT),
+        Column('soc', 'soc', AMOUNT),
+        Column('value', 'value', AMOUNT),
+        Column('inserted_at', 'insertedAt', TIME),
+    ), ('tx_hash',)),
+}
+
+
+def _lookup(record: dict, path: str):
+    for key in path.split('.'):
+        if record is None:
+            return None
+        record = record.get(key)
+    return record
+
+
+def _parse_time(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+    value = value.replace('Z', '+00:00')
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+_CONVERTERS = {
+    AMOUNT: lambda v: None if v is None else decimal.Decimal(str(v)),
+    TIME: _parse_time,
+    'int': lambda v: None if v is None else int(v),
+    'bool': lambda v: None if v is None else bool(v),
+    'str': lambda v: None if v is None else str(v),
+}
+
+
+def _arrow_type(pa, kind: str):
+    return {
+        AMOUNT: pa.decimal128(38, 18),
+        TIME: pa.timestamp('us', tz='UTC'),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'str': pa.string(),
+    }[kind]
+
+
+def to_columns(table: str, records: list) -> dict:
+    """typed column name -> list of values for the records of `table`"""
+    columns, _ = TABLES[table]
+    return {column.name: [_CONVERTERS[column.kind](_lookup(r, column.path)) for r in records]
+            for column in columns}
+
+
+def split_history(payments: list, transactions: dict, stakes: list) -> dict:
+    """table name -> list of API records"""
+    return {
+        'payments': payments,
+        'nmr_deposits': transactions.get('nmrDeposits') or [],
+        'nmr_withdrawals': transactions.get('nmrWithdrawals') or [],
+        'usd_withdrawals': transactions.get('usdWithdrawals') or [],
+        'stakes': stakes,
+    }
+
+
+class HistoryExporter(object):
+    """append new payments, transactions and stakes of one account
+
+    api: authenticated `NumerAPI` instance
+    store_dir: directory of the store, one subdirectory per table
+    """
+
+    def __init__(self, api, store_dir: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as err:
+            raise RuntimeError('the history export requires pyarrow: pip install numerapi[parquet]') from err
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.api = api
+        self.store_dir = store_dir
+
+    def schema(self, table: str):
+        columns, _ = TABLES[table]
+        pa = self._pa
+        return pa.schema([(c.name, _arrow_type(pa, c.kind)) for c in columns])
+
+    def _table_dir(self, table: str) -> str:
+        return os.path.join(self.store_dir, table)
+
+    def _parts(self, table: str) -> list:
+        """paths of the stored parts in write order"""
+        directory = self._table_dir(table)
+        return [os.path.join(directory, name) for name in self._load_index(table)[0]['parts']]
+
+    def _read_keys(self, table: str, path: str) -> list:
+        _, key_columns = TABLES[table]
+        data = self._pq.read_table(path, columns=list(key_columns)).to_pydict()
+        return [list(key) for key in zip(*(data[name] for name in key_columns))]
+
+    def _load_index(self, table: str) -> tuple:
+        """{"parts": [...], "keys": [...], "removed": [...]} of `table`, and
+        whether it differs from the stored index
+
+        parts on disk that the index does not list yet (the run that wrote
+        them stopped before updating it) are added; parts it lists as
+        removed by a compaction are deleted
+        """
+        directory = self._table_dir(table)
+        try:
+            with open(os.path.join(directory, KEY_INDEX)) as fh:
+                index = json.load(fh)
+        except FileNotFoundError:
+            index = {'parts': [], 'keys': [], 'removed': []}
+        if not os.path.isdir(directory):
+            return index, False
+        changed = bool(index['removed'])
+        listed = set(index['parts'])
+        removed = set(index['removed'])
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.parquet') or name in listed:
+                continue
+            if name in removed:
+                os.remove(os.path.join(directory, name))
+                continue
+            index['keys'].extend(self._read_keys(table, os.path.join(directory, name)))
+            index['parts'].append(name)
+            changed = True
+        index['parts'].sort()
+        index['removed'] = []
+        return index, changed
+
+    def _save_index(self, table: str, index: dict):
+        directory = self._table_dir(table)
+        tmp = os.path.join(directory, '.' + KEY_INDEX + '.tmp')
+        with open(tmp, 'w') as fh:
+            json.dump(index, fh)
+        os.replace(tmp, os.path.join(directory, KEY_INDEX))
+
+    def _write_part(self, directory: str, data, name: str = None) -> str:
+        if name is None:
+            name = 'part-{:%Y%m%dT%H%M%S%f}-{}'.format(
+                datetime.datetime.now(datetime.timezone.utc), uuid.uuid4().hex[:8])
+        tmp = os.path.join(directory, '.' + name + '.tmp')
+        self._pq.write_table(data, tmp)
+        os.replace(tmp, os.path.join(directory, name + '.parquet'))
+        return name + '.parquet'
+
+    def known_keys(self, table: str) -> set:
+        """keys of all stored records, read from the index"""
+        return {tuple(key) for key in self._load_index(table)[0]['keys']}
+
+    def append(self, table: str, records: list) -> int:
+        """store the records of `table` that are new, return how many
+
+        records whose key contains None are skipped, they are stored by a
+        later run once their key is set
+        """
+        _, key_columns = TABLES[table]
+        columns = to_columns(table, records)
+        directory = self._table_dir(table)
+        os.makedirs(directory, exist_ok=True)
+        with file_lock(os.path.join(directory, '.lock')):
+            index, changed = self._load_index(table)
+            known = {tuple(key) for key in index['keys']}
+            keep = []
+            for i, key in enumerate(zip(*(columns[name] for name in key_columns))):
+                if None in key:
+                    continue
+                if key not in known:
+                    known.add(key)
+                    keep.append(i)
+                    index['keys'].append(list(key))
+            if not keep:
+                if changed:
+                    self._save_index(table, index)
+                return 0
+
+            new = {name: [values[i] for i in keep] for name, values in columns.items()}
+            data = self._pa.Table.from_pydict(new, schema=self.schema(table))
+            index['parts'].append(self._write_part(directory, data))
+            self._save_index(table, index)
+            self._compact(table, index)
+        return len(keep)
+
+    def _compact(self, table: str, index: dict):
+        """merge the small parts written after the last large one"""
+        directory = self._table_dir(table)
+        small = []
+        for name in reversed(index['parts']):
+            if os.path.getsize(os.path.join(directory, name)) >= COMPACT_SIZE:
+                break
+            small.insert(0, name)
+        if len(small) <= COMPACT_PARTS:
+            return
+        data = self._pa.concat_tables(
+            self._pq.read_table(os.path.join(directory, name)) for name in small)
+        # the merged part takes the place of the first one in the order
+        merged = self._write_part(directory, data,
+                                  small[0][:-len('.parquet')] + '-' + uuid.uuid4().hex[:8])
+        index['parts'] = index['parts'][:-len(small)] + [merged]
+        index['removed'] = small
+        self._save_index(table, index)
+        for name in small:
+            os.remove(os.path.join(directory, name))
+        index['removed'] = []
+        self._save_index(table, index)
+
+    def export(self) -> dict:
+        """fetch the account history and append what is new
+
+        returns table name -> number of new records
+        """
+        history = split_history(self.api.get_payments(),
+                                self.api.get_transactions(),
+                                self.api.get_stakes())
+        return {table: self.append(table, records) for table, records in history.items()}
+
+    def read(self, table: str):
+        """all stored records of `table` as a `pyarrow.Table`"""
+        parts = self._parts(table)
+        if not parts:
+            return self.schema(table).empty_table()
+        return self._pa.concat_tables(self._pq.read_table(part) for part in parts)
@@ -0,0 +1,70 @@
+"""HTTP/2 transport for GraphQL queries
+
+`Http2Transport` can be passed to `NumerApiManager` as `transport`. All
+queries, including those of concurrent threads and `raw_query_async`
+coroutines, are then multiplexed as streams over one connection instead of
+one connection per request in flight. The manager runs up to `max_streams`
+async queries at once. Servers that do not offer HTTP/2
+during the TLS handshake are talked to with HTTP/1.1.
+
+Requires httpx (`pip install numerapi[http2]`).
+"""
+import threading
+
+
+class Http2Transport(object):
+    """posts requests over a shared, lazily opened HTTP/2 connection
+
+    max_streams: most requests in flight at once; further callers wait for a
+        free stream. With an HTTP/1.1 fallback this bounds the number of
+        connections instead.
+    timeout: most seconds to wait for the server, None to wait forever;
+        a shorter timeout of a request (e.g. `NumerApiManager(timeout=...)`
+        or a deadline) applies instead
+    """
+
+    def __init__(self, max_streams: int = 100, timeout: float = None):
+        if max_streams < 1:
+            raise ValueError('max_streams must be at least 1')
+        self.max_streams = max_streams
+        self.timeout = timeout
+        # protocol of the last response, "HTTP/2" or "HTTP/1.1"
+        self.http_version = None
+        self._streams = threading.BoundedSemaphore(max_streams)
+        self._lock = threading.Lock()
+        self._client = None
+
+    @property
+    def client(self):
+        """`httpx.Client`, created on first use"""
+        with self._lock:
+            if self._client is None:
+                try:
+                    import httpx
+                except ImportError as err:
+                    raise RuntimeError('the HTTP/2 transport requires httpx: '
+                                       'pip install numerapi[http2]') from err
+                limits = httpx.Limits(max_connections=self.max_streams,
+                                      max_keepalive_connections=self.max_streams)
+                self._client = httpx.Client(http2=True, limits=limits, timeout=self.timeout)
+            return self._client
+
+    def post(self, url: str, json=None, headers=None, timeout: float = None):
+        """send a POST request, the response has `json()` like in requests
+
+        timeout: seconds for this request, capped by the transport's timeout
+        """
+        client = self.client
+        if self.timeout is not None:
+            timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        with self._streams:
+            response = client.post(url, json=json, headers=headers, **kwargs)
+        self.http_version = response.http_version
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
@@ -0,0 +1,46 @@
+"""advisory inter-process file locks"""
+import contextlib
+import os
+
+# exactly one of them is available
+fcntl = msvcrt = None
+try:
+    import fcntl
+except ImportError:  # windows
+    import msvcrt
+
+
+def _lock_windows(fd: int):
+    # LK_LOCK gives up with OSError after about 10 attempts, one per second;
+    # keep trying since a download can hold the lock for minutes
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """hold an exclusive advisory lock on `path` while in the block
+
+    the lock file is created if needed and left in place afterwards, removing
+    it would race with processes waiting for it. On POSIX waiting processes
+    block in the kernel; on Windows they retry once a second until the lock
+    is free.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            _lock_windows(fd)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
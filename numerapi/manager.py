@@ -73,10 +73,14 @@ class IManager(Interface):
         :return:
         """
 
-    def upload_predictions(self, file_path: str) -> dict:
+    def upload_predictions(self, file_path: str, tournament_data_path: str = None,
+                           data: bytes = None) -> dict:
         """
+        validate and upload a predictions file
 
-        :param _:
+        :param file_path:
+        :param tournament_data_path: extracted tournament data to check the ids against (optional)
+        :param data: contents of the file if already read, it is then not read again (optional)
         :return:
         """
 
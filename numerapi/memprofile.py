@@ -0,0 +1,211 @@
+"""opt-in memory accounting of large operations
+
+Pass a `MemoryProfiler` to `NumerAPI(profiler=...)` to record, for each JSON
+decode, dataset download, extraction and upload read, the
+bytes allocated by Python (tracemalloc) and the resident set size of the
+process before, after and at its peak. `report` aggregates the records per
+operation and can be saved and compared against the report of another
+release.
+
+With a `budget`, the resident set size is checked at the start of each
+operation and after every chunk of a download or extraction. Going over
+`warn_at` (by default 80% of the budget) logs a warning while there is still
+room; going over the budget logs another one or, with `abort=True`, raises
+RuntimeError before more memory is taken. Each operation warns at most once
+per threshold.
+
+tracemalloc slows down allocations considerably, so only profile to
+investigate. Operations running concurrently in several threads are counted
+towards each other. The peak of traced memory can only be reset from Python
+3.9 on; before, "allocated" is the growth of traced memory from the start to
+the end of an operation, so temporary allocations freed inside it are missed.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# fraction of the budget at which the soft warning is logged
+WARN_FRACTION = 0.8
+
+
+def current_rss():
+    """resident set size of this process in bytes, None if unknown"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """highest resident set size of this process in bytes, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class _Frame(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, start: int):
+        self.start = start
+        self.peak = start
+        # highest threshold warned about: 0 none, 1 warn_at, 2 budget
+        self.warned = 0
+
+
+def _traced_peak(tracemalloc) -> int:
+    """peak of traced memory since the last reset; without `reset_peak`
+    (before python 3.9) the current size, as the peak is never reset"""
+    current, peak = tracemalloc.get_traced_memory()
+    return peak if hasattr(tracemalloc, 'reset_peak') else current
+
+
+class MemoryProfiler(object):
+    """records memory use per operation
+
+    budget: resident set size in bytes that operations should stay below
+        (optional)
+    abort: raise RuntimeError instead of logging a warning when the budget
+        is exceeded
+    warn_at: resident set size in bytes above which a warning is logged
+        before the budget is reached (default: 80% of the budget)
+    """
+
+    def __init__(self, budget: int = None, abort: bool = False, warn_at: int = None):
+        self.budget = budget
+        self.abort = abort
+        if warn_at is None and budget is not None:
+            warn_at = int(budget * WARN_FRACTION)
+        self.warn_at = warn_at
+        # one dict per tracked call, see `track`
+        self.records = []
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+
+    @contextlib.contextmanager
+    def track(self, operation: str):
+        """record the memory used by the block as `operation`
+
+        appends a dict with "operation", "seconds", "allocated" (peak bytes
+        traced above the start), "rss_before", "rss_after" and "peak_rss"
+        """
+        import tracemalloc
+
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        stack = self._stack()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, _traced_peak(tracemalloc))
+        if hasattr(tracemalloc, 'reset_peak'):  # python 3.9
+            tracemalloc.reset_peak()
+        frame = _Frame(tracemalloc.get_traced_memory()[0])
+        stack.append(frame)
+        rss_before = current_rss()
+        start = time.perf_counter()
+        try:
+            self.check(operation)
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            frame.peak = max(frame.peak, _traced_peak(tracemalloc))
+            stack.pop()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, frame.peak)
+            record = {'operation': operation, 'seconds': seconds,
+                      'allocated': frame.peak - frame.start,
+                      'rss_before': rss_before, 'rss_after': current_rss(),
+                      'peak_rss': peak_rss()}
+            with self._lock:
+                self.records.append(record)
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def check(self, operation: str):
+        """compare the resident set size with `warn_at` and the budget
+
+        call it between the chunks of long operations
+        """
+        if self.budget is None and self.warn_at is None:
+            return
+        rss = current_rss()
+        if rss is None:
+            return
+        if self.budget is not None and rss > self.budget:
+            level, what = 2, 'exceeds the memory budget'
+        elif self.warn_at is not None and rss > self.warn_at:
+            level, what = 1, 'is close to the memory budget'
+        else:
+            return
+        msg = '{} {}: {} bytes resident, warning at {} and limit {}'.format(
+            operation, what, rss, self.warn_at, self.budget)
+        if level == 2 and self.abort:
+            raise RuntimeError(msg)
+        stack = self._stack()
+        if stack:
+            if stack[-1].warned >= level:
+                return
+            stack[-1].warned = level
+        self.logger.warning(msg)
+
+    def stop(self):
+        """stop tracemalloc if this profiler started it"""
+        import tracemalloc
+
+        with self._lock:
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def report(self) -> dict:
+        """operation -> "calls", "seconds", "max_allocated", "max_peak_rss" """
+        report = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            entry = report.setdefault(record['operation'], {
+                'calls': 0, 'seconds': 0.0, 'max_allocated': 0, 'max_peak_rss': None})
+            entry['calls'] += 1
+            entry['seconds'] += record['seconds']
+            entry['max_allocated'] = max(entry['max_allocated'], record['allocated'])
+            if record['peak_rss'] is not None:
+                entry['max_peak_rss'] = max(entry['max_peak_rss'] or 0, record['peak_rss'])
+        return report
+
+    def save(self, path: str):
+        with open(path, 'w') as fh:
+            json.dump(self.report(), fh, indent=2, sort_keys=True)
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """operations whose largest allocation grew by more than `tolerance`"""
+    regressions = []
+    for operation, entry in sorted(report.items()):
+        if operation not in baseline:
+            continue
+        old, new = baseline[operation]['max_allocated'], entry['max_allocated']
+        if new > old * (1 + tolerance):
+            regressions.append('{}: {} -> {} bytes'.format(operation, old, new))
+    return regressions
+
+
+def track(profiler, operation: str):
+    """`profiler.track(operation)`, or a no-op if `profiler` is None"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.track(operation)
@@ -1,19 +1,94 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import datetime
 import errno
+import json
 import logging
 import os
+import threading
+import time
+import uuid
 import zipfile
-
-from numerapi.api_manager import NumerApiManager
-from numerapi.manager import IManager
-
-
-class NumerAPI(object):
+from typing import TYPE_CHECKING
+
+from numerapi.locking import file_lock
+from numerapi.memprofile import track
+
+if TYPE_CHECKING:
+    from numerapi.manager import IManager
+
+# written into the unzip directory once extraction has finished
+UNZIP_COMPLETE_MARKER = '.complete'
+# CRC-32 and size of each extracted member, used to skip unchanged members
+MEMBER_INDEX = '.members.json'
+DATASET_FILES = ('numerai_tournament_data.csv', 'numerai_training_data.csv')
+# seconds the round numbers of the last `get_competitions` are used to
+# reject unknown rounds without asking the server
+ROUNDS_TTL = 600
+# bytes of a member copied at once during extraction
+EXTRACT_CHUNK = 1 << 20
+
+
+def member_key(name: str, crc: int, size: int) -> str:
+    """key of an extracted member in `MEMBER_INDEX`"""
+    return '{}:{:08x}:{}'.format(name, crc, size)
+
+
+def write_member_index(unzip_path: str, members: dict):
+    """store member key -> path relative to `unzip_path` as `MEMBER_INDEX`
+
+    written last, only complete extractions are used as link sources
+    """
+    index_path = os.path.join(unzip_path, MEMBER_INDEX)
+    with open(index_path + '.part', 'w') as fh:
+        json.dump(members, fh)
+    os.replace(index_path + '.part', index_path)
+
+
+def _extracted_members(dest_path: str) -> dict:
+    """member key -> path for the extractions found in `dest_path`"""
+    found = {}
+    try:
+        entries = sorted(os.listdir(dest_path))
+    except OSError:
+        return found
+    for entry in entries:
+        index_path = os.path.join(dest_path, entry, MEMBER_INDEX)
+        try:
+            with open(index_path) as fh:
+                members = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        for key, path in members.items():
+            found[key] = os.path.join(dest_path, entry, path)
+    return found
+
+
+def _link_unchanged(source: str, target: str, size: int) -> bool:
+    """hard link `source` to `target`, False if it has to be extracted instead"""
+    if source is None:
+        return False
+    try:
+        if os.stat(source).st_size != size:
+            return False
+        if os.path.exists(target):
+            if os.path.samefile(source, target):
+                return True
+            os.remove(target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.link(source, target)
+    except OSError:
+        # gone in the meantime, or links not supported across file systems
+        return False
+    return True
+
+
+class NumerAPI(object):  # pylint: disable=too-many-instance-attributes
     """Wrapper around the Numerai API"""
 
-    def __init__(self, public_id=None, secret_key=None, verbosity="INFO", manager: IManager = NumerApiManager()):
+    def __init__(self, public_id=None, secret_key=None, verbosity="INFO", manager: 'IManager' = None,
+                 profiler=None, upload_record: str = None):
         """
         initialize Numerai API wrapper for Python
 
@@ -23,6 +98,15 @@ class NumerAPI(object):
                     Numer.ai->Account->Custom API keys
         verbosity: indicates what level of messages should be displayed
             valid values: "debug", "info", "warning", "error", "critical"
+        manager: implementation of `IManager` to talk to, defaults to a
+            `NumerApiManager` that is created on first use; the client uses
+            a view of it with its own token (`with_token`, or a shallow copy
+            for managers without), so one manager can serve many clients
+        profiler: `memprofile.MemoryProfiler` to record the memory use of
+            large operations with (optional)
+        upload_record: JSON file to remember the content hashes of uploads
+            in; identical predictions are then not uploaded twice in a round
+            (optional)
         """
         if public_id and secret_key:
             token = (public_id, secret_key)
@@ -32,26 +116,70 @@ class NumerAPI(object):
             print("You need to supply both a public id and a secret key.")
             token = None
 
-        manager.set_token(token)
-        self._manager = manager
-        self.logger = logging.getLogger(__name__)
-
-        # set up logging
+        self._token = token
+        self.profiler = profiler
+        self.upload_record = upload_record
+        self._manager = None
+        self._manager_lock = threading.Lock()
+        self._local = threading.local()
+        # (time of `get_competitions`, round numbers it returned)
+        self._rounds = None
+        if manager is not None:
+            self.manager = manager
+
+        # only the level of this package's logger is set; configuring
+        # handlers is left to the application
         numeric_log_level = getattr(logging, verbosity.upper())
         if not isinstance(numeric_log_level, int):
             raise ValueError('invalid verbosity: %s' % verbosity)
-        log_format = "%(asctime)s %(levelname)s %(name)s: %(message)s"
-        logging.basicConfig(format=log_format, level=numeric_log_level)
-        self.submission_id = None
+        logging.getLogger('numerapi').setLevel(numeric_log_level)
+        self.logger = logging.getLogger(__name__)
 
     @property
-    def manager(self) -> IManager:
+    def manager(self) -> 'IManager':
+        if self._manager is None:
+            with self._manager_lock:
+                if self._manager is None:
+                    from numerapi.api_manager import NumerApiManager
+                    self.manager = NumerApiManager()
         return self._manager
 
     @manager.setter
-    def manager(self, manager: IManager):
+    def manager(self, manager: 'IManager'):
+        # the manager may be shared by several clients: work on a view with
+        # this client's token instead of changing the manager passed in
+        if hasattr(manager, 'with_token'):
+            manager = manager.with_token(self._token)
+        else:
+            manager = copy.copy(manager)
+            manager.set_token(self._token)
+        if self.profiler is not None and hasattr(manager, 'profiler'):
+            manager.profiler = self.profiler
         self._manager = manager
 
+    @property
+    def submission_id(self):
+        """id of the last upload done by the current thread"""
+        return getattr(self._local, 'submission_id', None)
+
+    @submission_id.setter
+    def submission_id(self, submission_id):
+        self._local.submission_id = submission_id
+
+    def for_account(self, public_id, secret_key) -> 'NumerAPI':
+        """client for another account that shares this client's connections
+
+        the manager must support `with_token`, as `NumerApiManager` does.
+        Both clients can be used from any number of threads.
+        """
+        # pylint: disable=protected-access
+        api = copy.copy(self)
+        api._token = (public_id, secret_key)
+        api._manager = self.manager.with_token(api._token)
+        api._manager_lock = threading.Lock()
+        api._local = threading.local()
+        return api
+
     def download_current_dataset(self, dest_path=".", dest_filename=None,
                                  unzip=True):
         """download dataset for current round
@@ -59,31 +187,58 @@ class NumerAPI(object):
         dest_path: desired location of dataset file (optional)
         dest_filename: desired filename of dataset file (optional)
         unzip: indicates whether to unzip dataset
+
+        Several processes may call this concurrently for the same path: one
+        of them downloads and extracts while the others wait on a lock file
+        and then reuse the result. With `upload_record`, the current round is
+        stored in it for `upload_predictions`.
         """
+        if self.upload_record is not None:
+            self._record_round(self.get_current_round())
         self.logger.info("downloading current dataset...")
         dest_filename, dataset_path = NumerAPI.get_download_paths(dest_path, dest_filename)
+        unzip_dir_path = os.path.join(dest_path, dest_filename[:-4])
+        unzip_marker = os.path.join(unzip_dir_path, UNZIP_COMPLETE_MARKER)
 
-        if os.path.exists(dataset_path):
+        if os.path.exists(dataset_path) and (not unzip or os.path.exists(unzip_marker)):
             self.logger.info("target file {} already exists".format(dataset_path))
-        else:
-            # create parent folder if necessary
-            try:
-                os.makedirs(dest_path)
-            except OSError as exception:
-                if exception.errno != errno.EEXIST:
-                    raise
-            self.manager.download_data_set(dataset_path)
-
-        if unzip:
-            unzip_dir_path = os.path.join(dest_path, dest_filename[:-4])
-            if os.path.exists(unzip_dir_path):
-                self.logger.info('destination unzip path already exists: {}'.format(dest_filename))
+            return dataset_path
+
+        # create parent folder if necessary
+        try:
+            os.makedirs(dest_path)
+        except OSError as exception:
+            if exception.errno != errno.EEXIST:
+                raise
+
+        with file_lock(dataset_path + '.lock'):
+            if os.path.exists(dataset_path):
+                self.logger.info("target file {} already exists".format(dataset_path))
             else:
-                self.unzip_data_set(dest_path, dataset_path, dest_filename)
+                # download next to the target and rename, so that the zip
+                # file only ever exists complete
+                part_path = dataset_path + '.part'
+                self.manager.download_data_set(part_path)
+                os.replace(part_path, dataset_path)
+
+            if unzip:
+                if os.path.exists(unzip_marker):
+                    self.logger.info('destination unzip path already exists: {}'.format(dest_filename))
+                else:
+                    self.unzip_data_set(dest_path, dataset_path, dest_filename)
+                    with open(unzip_marker, 'w'):
+                        pass
 
         return dataset_path
 
     def unzip_data_set(self, dest_path: str, dataset_path: str, dest_filename: str) -> None:
+        """extract the dataset zip into `dest_path`/`dest_filename` without ".zip"
+
+        members whose CRC-32 and size in the zip match a file extracted
+        earlier into a sibling directory of `dest_path` (e.g. the training
+        data of the previous round) are hard linked from there instead of
+        decompressed again, so they share their content with that file.
+        """
         # remove the ".zip" in the end
         dataset_name = dest_filename[:-4]
 
@@ -97,22 +252,46 @@ class NumerAPI(object):
         except OSError as exception:
             if exception.errno != errno.EEXIST:
                 raise
-        with zipfile.ZipFile(dataset_path, "r") as z:
-            z.extractall(unzip_path)
 
-        import shutil
-        tourn_file = '%s/numerai_dataset/numerai_tournament_data.csv' % unzip_path
-        train_file = '%s/numerai_dataset/numerai_training_data.csv' % unzip_path
-
-        assert os.path.exists(tourn_file)
-        assert os.path.exists(train_file)
-
-        shutil.move(
-            tourn_file,
-            '%s/numerai_tournament_data.csv' % unzip_path)
-        shutil.move(
-            train_file,
-            '%s/numerai_training_data.csv' % unzip_path)
+        previous = _extracted_members(dest_path)
+        members = {}
+        with track(self.profiler, 'extract'), zipfile.ZipFile(dataset_path, "r") as z:
+            for info in z.infolist():
+                if info.is_dir():
+                    z.extract(info, unzip_path)
+                    continue
+                # the csv files end up directly in the unzip directory
+                name = os.path.basename(info.filename)
+                if name in DATASET_FILES:
+                    target = os.path.join(unzip_path, name)
+                else:
+                    parts = [p for p in info.filename.split('/') if p not in ('', '.', '..')]
+                    target = os.path.join(unzip_path, *parts)
+                key = member_key(name, info.CRC, info.file_size)
+                if _link_unchanged(previous.get(key), target, info.file_size):
+                    self.logger.info('{} is unchanged, linked from {}'.format(name, previous[key]))
+                else:
+                    self._extract_member(z, info, target)
+                members[key] = os.path.relpath(target, unzip_path)
+
+        for name in DATASET_FILES:
+            assert os.path.exists(os.path.join(unzip_path, name))
+
+        write_member_index(unzip_path, members)
+
+    def _extract_member(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo, target: str):
+        """copy a member to `target` in chunks, checking the memory budget
+
+        written next to `target` and moved over it, so a hard link from an
+        earlier extraction is replaced instead of overwritten
+        """
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with archive.open(info) as src, open(target + '.part', 'wb') as dst:
+            for chunk in iter(lambda: src.read(EXTRACT_CHUNK), b''):
+                dst.write(chunk)
+                if self.profiler is not None:
+                    self.profiler.check('extract')
+        os.replace(target + '.part', target)
 
     @staticmethod
     def get_download_paths(dest_path: str, dest_filename: str) -> (str, str):
@@ -133,8 +312,7 @@ class NumerAPI(object):
 
         round_num: The round you are interested in, defaults to current round.
         """
-        if not isinstance(round_num, int):
-            raise ValueError('type of round_num argument should be int but was "%s"' % str(type(round_num)))
+        self._check_round(round_num)
 
         self.logger.info("getting leaderboard for round {}".format(round_num))
         result = self.manager.get_leaderboard(round_num)
@@ -146,6 +324,8 @@ class NumerAPI(object):
 
         round_num: The round you are interested in, defaults to current round.
         """
+        self._check_round(round_num)
+
         self.logger.info("getting stakes for round {}".format(round_num))
         result = self.manager.get_staking_leaderboard(round_num)
         stakes = result['data']['rounds'][0]['leaderboard']
@@ -158,7 +338,33 @@ class NumerAPI(object):
         """ get information about rounds """
         self.logger.info("getting rounds...")
         result = self.manager.get_competitions()
-        return result['data']['rounds']
+        rounds = result['data']['rounds']
+        self._rounds = (time.monotonic(), frozenset(item['number'] for item in rounds))
+        return rounds
+
+    def _check_round(self, round_num):
+        """raise ValueError for round numbers that cannot exist
+
+        besides the type and sign, the round is looked up in the rounds of
+        the last `get_competitions` call if it was made within `ROUNDS_TTL`.
+        A round missing there may have opened since, so the rounds are
+        fetched once more before the round is rejected.
+        """
+        if not isinstance(round_num, int) or isinstance(round_num, bool):
+            raise ValueError('type of round_num argument should be int but was "%s"' % str(type(round_num)))
+        if round_num < 0:
+            raise ValueError('round_num should not be negative but was %d' % round_num)
+        rounds = self._rounds
+        if round_num == 0 or rounds is None or not rounds[1] or \
+                time.monotonic() - rounds[0] > ROUNDS_TTL:
+            return
+        if round_num in rounds[1]:
+            return
+        self.get_competitions()
+        known = self._rounds[1]
+        if known and round_num not in known:
+            raise ValueError('no such round %d, known rounds are %d to %d' % (
+                round_num, min(known), max(known)))
 
     def get_current_round(self):
         data = self.manager.get_current_round()
@@ -195,29 +401,88 @@ class NumerAPI(object):
         the account
 
         submission_id: submission of interest, defaults to the last submission
-            done with the account
+            done with the account by the current thread
         """
         if submission_id is None:
             submission_id = self.submission_id
 
         if submission_id is None:
             raise ValueError('You need to submit something first or provide a submission ID')
+        try:
+            uuid.UUID(submission_id)
+        except (TypeError, ValueError, AttributeError) as err:
+            raise ValueError('submission ID should be a UUID string but was %r'
+                             % (submission_id,)) from err
 
         data = self.manager.get_submission(submission_id)
         status = data['data']['submissions'][0]
         return status
 
-    def upload_predictions(self, file_path):
+    def upload_predictions(self, file_path, tournament_data_path=None, force=False,
+                           round_num=None):
         """uploads predictions from file
 
         file_path: CSV file with predictions that will get uploaded
+        tournament_data_path: extracted `numerai_tournament_data.csv` of the
+            current round (optional); the predictions are checked to cover
+            exactly its ids before anything is sent
+        force: upload even if the same content was uploaded before
+        round_num: current round, only used with `upload_record`; defaults
+            to the round of the latest `download_current_dataset`
+
+        the file is always checked for the header, duplicate ids and
+        probabilities outside (0, 1) first, a ValueError is raised if it
+        would be rejected. With `upload_record`, the submission id of an
+        earlier upload of identical content by the account in this round is
+        returned without uploading again.
         """
+        if self.upload_record is None or self._token is None:
+            return self._upload(file_path, tournament_data_path)
+
+        from numerapi.uploads import UploadRecord, content_hash
+
+        # read once, for the hash and the upload
+        with track(self.profiler, 'upload_read'), open(file_path, 'rb') as fh:
+            data = fh.read()
+        digest = content_hash(data)
+        record = UploadRecord(self.upload_record)
+        # held until the upload is recorded, concurrent uploads of the same
+        # content wait for it instead of uploading again
+        with record.locked():
+            if round_num is None:
+                round_num = record.round
+            if round_num is None:
+                self.logger.warning("round unknown, download the dataset or pass round_num "
+                                    "to skip identical uploads")
+                return self._upload(file_path, tournament_data_path, data)
+            previous = None if force else record.get(self._token[0], round_num, digest)
+            if previous is not None:
+                self.logger.info("identical predictions already uploaded as {}".format(previous))
+                self.submission_id = previous
+                return previous
+            submission_id = self._upload(file_path, tournament_data_path, data)
+            record.add(self._token[0], round_num, digest, submission_id)
+        return submission_id
+
+    def _upload(self, file_path, tournament_data_path=None, data=None):
         self.logger.info("uploading prediction...")
-        create = self.manager.upload_predictions(file_path)
-
+        # only pass what is given, for managers without these arguments
+        kwargs = {}
+        if tournament_data_path is not None:
+            kwargs['tournament_data_path'] = tournament_data_path
+        if data is not None:
+            kwargs['data'] = data
+        create = self.manager.upload_predictions(file_path, **kwargs)
         self.submission_id = create['data']['create_submission']['id']
         return self.submission_id
 
+    def _record_round(self, round_num: int):
+        from numerapi.uploads import UploadRecord
+
+        record = UploadRecord(self.upload_record)
+        with record.locked():
+            record.set_round(round_num)
+
     def stake(self, confidence, value):
         """ participate in the staking competition
 
@@ -226,28 +491,12 @@ class NumerAPI(object):
         """
         # TODO: does not seem to be complete
 
-        query = '''
-          mutation($code: String,
-            $confidence: String!
-            $password: String
-            $round: Int!
-            $value: String!) {
-              stake(code: $code
-                    confidence: $confidence
-                    password: $password
-                    round: $round
-                    value: $value) {
-                id
-                status
-                txHash
-                value
-              }
-        }
-        '''
+        from numerapi import queries
+
         arguments = {'code': 'somecode',
                      'confidence': str(confidence),
                      'password': "somepassword",
                      'round': self.get_current_round(),
                      'value': str(value)}
-        result = self.manager.raw_query(query, arguments, authorization=True)
+        result = self.manager.raw_query(queries.STAKE.text, arguments, authorization=True)
         return result['data']
@@ -0,0 +1,258 @@
+"""overlapped download -> extract -> predict -> upload for a round
+
+`RoundPipeline` runs the stages of a round job concurrently instead of one
+after the other:
+
+* a fetch thread receives the dataset zip and writes it to disk,
+* the calling thread decompresses the members as the bytes arrive, writes
+  them to the usual extraction directory and parses the tournament rows,
+* batches of rows go to a pool of workers running the user's `predict`,
+* finished batches are encoded in order into the predictions file, which is
+  validated and uploaded once the last batch is done.
+
+Pre-signed upload URLs need the content length up front, so the upload itself
+starts after the last prediction; everything before it overlaps.
+"""
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from numerapi.locking import file_lock
+from numerapi.numerapi import NumerAPI, UNZIP_COMPLETE_MARKER, member_key, write_member_index
+from numerapi.streamzip import iter_members
+
+TOURNAMENT_FILE = 'numerai_tournament_data.csv'
+# downloaded chunks of 64 KiB held while extraction catches up
+QUEUE_CHUNKS = 256
+
+# ids, eras and data_types are lists of str, features a list of lists of
+# float, all in the row order of the tournament data
+Batch = namedtuple('Batch', ['ids', 'eras', 'data_types', 'features'])
+
+
+class _QueueReader(io.RawIOBase):
+    """file-like view on chunks put into a queue by another thread"""
+
+    def __init__(self, chunks: queue.Queue):
+        super().__init__()
+        self._chunks = chunks
+        self._buffer = b''
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if not self._buffer and not self.eof:
+            chunk = self._chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk is None:
+                self.eof = True
+            else:
+                self._buffer = chunk
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class RoundPipeline(object):  # pylint: disable=too-many-instance-attributes
+    """download, predict and upload for the current round with overlapping stages
+
+    api: `NumerAPI` instance with credentials
+    predict: callable taking a `Batch` and returning one probability per row
+    dest_path, dest_filename: as for `NumerAPI.download_current_dataset`
+    batch_size: rows per `predict` call
+    workers: number of concurrent `predict` calls
+    executor: `concurrent.futures.Executor` to run `predict` in, e.g. a
+        process pool for pure Python models (optional)
+    """
+
+    def __init__(self, api: NumerAPI, predict, dest_path: str = '.', dest_filename: str = None,
+                 batch_size: int = 10000, workers: int = None, executor=None):
+        self.api = api
+        self.predict = predict
+        self.dest_path = dest_path
+        self.dest_filename, self.dataset_path = NumerAPI.get_download_paths(dest_path, dest_filename)
+        self.unzip_path = os.path.join(dest_path, self.dest_filename[:-4])
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def tournament_path(self) -> str:
+        return os.path.join(self.unzip_path, TOURNAMENT_FILE)
+
+    @property
+    def predictions_path(self) -> str:
+        return os.path.join(self.unzip_path, 'predictions.csv')
+
+    def run(self) -> str:
+        """run the pipeline and return the submission id"""
+        os.makedirs(self.dest_path, exist_ok=True)
+        with file_lock(self.dataset_path + '.lock'):
+            marker = os.path.join(self.unzip_path, UNZIP_COMPLETE_MARKER)
+            if os.path.exists(self.dataset_path) and os.path.exists(marker):
+                self.logger.info('dataset already extracted, reading {}'.format(self.tournament_path))
+                with open(self.tournament_path, newline='') as fh:
+                    self._predict_rows(csv.reader(fh))
+            elif hasattr(self.api.manager, 'session'):
+                self._stream_dataset()
+                with open(marker, 'w'):
+                    pass
+            else:
+                # managers without an HTTP session cannot stream; the lock
+                # is already held, so go through the manager directly
+                if not os.path.exists(self.dataset_path):
+                    part_path = self.dataset_path + '.part'
+                    self.api.manager.download_data_set(part_path)
+                    os.replace(part_path, self.dataset_path)
+                self.api.unzip_data_set(self.dest_path, self.dataset_path, self.dest_filename)
+                with open(marker, 'w'):
+                    pass
+                with open(self.tournament_path, newline='') as fh:
+                    self._predict_rows(csv.reader(fh))
+
+        return self.api.upload_predictions(self.predictions_path,
+                                           tournament_data_path=self.tournament_path)
+
+    def _fetch(self, url: str, chunks: queue.Queue, cancel: threading.Event):
+        """write the dataset to disk and pass its chunks on until `cancel` is set"""
+
+        def put(item) -> bool:
+            while not cancel.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        part_path = self.dataset_path + '.part'
+        try:
+            response = self.api.manager.session.get(
+                url, stream=True, timeout=getattr(self.api.manager, 'timeout', None))
+            with response:
+                response.raise_for_status()
+                with open(part_path, 'wb') as fh:
+                    for chunk in response.iter_content(1 << 16):
+                        fh.write(chunk)
+                        if not put(chunk):
+                            break
+            if cancel.is_set():
+                os.remove(part_path)
+                return
+            os.replace(part_path, self.dataset_path)
+            put(None)
+        except Exception as err:  # pylint: disable=broad-except
+            put(err)
+
+    def _stream_dataset(self):
+        url = self.api.manager.get_link_to_current_dataset()
+        chunks = queue.Queue(maxsize=QUEUE_CHUNKS)
+        cancel = threading.Event()
+        fetcher = threading.Thread(target=self._fetch, args=(url, chunks, cancel),
+                                   name='numerapi-fetch', daemon=True)
+        fetcher.start()
+
+        os.makedirs(self.unzip_path, exist_ok=True)
+        reader = _QueueReader(chunks)
+        members = {}
+        try:
+            for member in iter_members(reader):
+                if member.name.endswith('/'):
+                    continue
+                # same layout as `NumerAPI.unzip_data_set`: files end up flat
+                target = os.path.join(self.unzip_path, os.path.basename(member.name))
+                with open(target + '.part', 'wb') as out:
+                    if os.path.basename(member.name) == TOURNAMENT_FILE:
+                        # csv reads to the end of the member, so all of it is copied
+                        text = io.TextIOWrapper(io.BufferedReader(_Tee(member, out)),
+                                                encoding='utf-8', newline='')
+                        self._predict_rows(csv.reader(text))
+                    else:
+                        for chunk in iter(lambda m=member: m.read(1 << 20), b''):
+                            out.write(chunk)
+                os.replace(target + '.part', target)
+                members[member_key(os.path.basename(member.name), member.crc, member.size)] = \
+                    os.path.basename(target)
+            # the rest of the archive (central directory) is still written to disk
+            while not reader.eof:
+                reader.read()
+        finally:
+            # stops the download if extraction or `predict` failed
+            cancel.set()
+            fetcher.join()
+        if not os.path.exists(self.dataset_path):
+            raise RuntimeError('download of {} did not complete'.format(url))
+        write_member_index(self.unzip_path, members)
+
+    def _batches(self, rows):
+        header = next(rows, None)
+        if header is None:
+            return
+        id_col, era_col, type_col = (header.index(c) for c in ('id', 'era', 'data_type'))
+        feature_cols = [i for i, name in enumerate(header) if name.startswith('feature')]
+        batch = Batch([], [], [], [])
+        for row in rows:
+            batch.ids.append(row[id_col])
+            batch.eras.append(row[era_col])
+            batch.data_types.append(row[type_col])
+            batch.features.append([float(row[i]) for i in feature_cols])
+            if len(batch.ids) >= self.batch_size:
+                yield batch
+                batch = Batch([], [], [], [])
+        if batch.ids:
+            yield batch
+
+    def _predict_rows(self, rows):
+        """run `predict` on batches of rows and write the predictions in order"""
+        own_executor = self.executor is None
+        executor = self.executor or ThreadPoolExecutor(self.workers)
+        in_flight = deque()
+
+        def write_oldest():
+            batch, future = in_flight.popleft()
+            probabilities = future.result()
+            if len(probabilities) != len(batch.ids):
+                raise ValueError('predict returned {} values for {} rows'.format(
+                    len(probabilities), len(batch.ids)))
+            out.writelines('{},{}\n'.format(i, p) for i, p in zip(batch.ids, probabilities))
+
+        try:
+            with open(self.predictions_path, 'w') as out:
+                out.write('id,probability\n')
+                for batch in self._batches(rows):
+                    in_flight.append((batch, executor.submit(self.predict, batch)))
+                    # bound memory: never more than two batches per worker
+                    if len(in_flight) >= 2 * self.workers:
+                        write_oldest()
+                while in_flight:
+                    write_oldest()
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+
+class _Tee(io.RawIOBase):
+    """reads from a member and copies everything read into `out`"""
+
+    def __init__(self, member, out):
+        super().__init__()
+        self._member = member
+        self._out = out
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._member.readinto(b)
+        self._out.write(bytes(b[:n]))
+        return n
@@ -0,0 +1,106 @@
+"""background prefetching of the dataset and metadata of a new round
+
+`DatasetPrefetcher` polls the cheap `get_current_round` query. As soon as a
+new round opens it downloads and extracts the dataset into a shared cache
+directory and stores the round metadata next to it, so workers starting for
+the round find everything on local disk via `read_current`.
+"""
+import json
+import logging
+import os
+import threading
+
+CURRENT_FILE = 'current_round.json'
+
+
+def dataset_filename(round_num: int) -> str:
+    return 'numerai_dataset_{}.zip'.format(round_num)
+
+
+def _write_json(path: str, data) -> None:
+    """write atomically, readers never see a partial file"""
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def read_current(cache_dir: str):
+    """metadata of the last prefetched round, None if nothing is cached yet
+
+    the result has the keys "round", "dataset_path", "unzip_path" and
+    "competitions"
+    """
+    try:
+        with open(os.path.join(cache_dir, CURRENT_FILE)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+class DatasetPrefetcher(object):
+    """poll for new rounds in a background thread and prefetch their data
+
+    api: `NumerAPI` instance
+    cache_dir: shared local directory for datasets and metadata
+    interval: seconds between polls of the current round
+    """
+
+    def __init__(self, api, cache_dir: str, interval: float = 60):
+        self.api = api
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+        current = read_current(cache_dir)
+        self.round_num = current['round'] if current else None
+
+    def check(self) -> bool:
+        """poll once, prefetch if a new round opened; True if it did"""
+        round_num = self.api.get_current_round()
+        if round_num == self.round_num:
+            return False
+        self.prefetch(round_num)
+        return True
+
+    def prefetch(self, round_num: int) -> dict:
+        self.logger.info("prefetching dataset for round {}".format(round_num))
+        filename = dataset_filename(round_num)
+        dataset_path = self.api.download_current_dataset(
+            dest_path=self.cache_dir, dest_filename=filename, unzip=True)
+        competitions = self.api.get_competitions()
+        current = {'round': round_num,
+                   'dataset_path': dataset_path,
+                   'unzip_path': dataset_path[:-4],
+                   'competitions': competitions}
+        _write_json(os.path.join(self.cache_dir, CURRENT_FILE), current)
+        self.round_num = round_num
+        return current
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:  # pylint: disable=broad-except
+                self.logger.exception("prefetching failed, retrying later")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='numerapi-prefetch',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
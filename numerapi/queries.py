@@ -0,0 +1,346 @@
+"""GraphQL documents sent by `NumerApiManager`
+
+Every document is minified and hashed once, when this module is imported.
+`compile` does the same for documents passed to `raw_query` directly and
+caches the result, so a document is only processed on its first use.
+
+The SHA-256 hash of the minified text is what automatic persisted queries
+send instead of the document, see `NumerApiManager(persisted_queries=True)`.
+
+`signature` reads the variable definitions of a document, `check_variables`
+compares the variables of a call against them before anything is sent.
+"""
+import functools
+import hashlib
+import re
+from collections import namedtuple
+
+# text: minified document
+# sha256: hex digest of `text`
+Query = namedtuple('Query', ['text', 'sha256'])
+
+_TOKEN = re.compile(r'#[^\n]*|"(?:\\.|[^"\\])*"|[\w$]+|[^\s\w]')
+
+
+def minify(document: str) -> str:
+    """drop comments and all whitespace that does not separate two names"""
+    out = []
+    previous = ''
+    for token in _TOKEN.findall(document):
+        if token.startswith('#'):
+            continue
+        if previous and _is_word(previous[-1]) and _is_word(token[0]):
+            out.append(' ')
+        out.append(token)
+        previous = token
+    return ''.join(out)
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char in '_$'
+
+
+@functools.lru_cache(maxsize=256)
+def compile(document: str) -> Query:  # pylint: disable=redefined-builtin
+    """minified text and hash of `document`, cached"""
+    text = minify(document)
+    return Query(text, hashlib.sha256(text.encode('utf-8')).hexdigest())
+
+
+CURRENT_ROUND = compile('''
+    query {
+      rounds(number: 0) {
+        number
+      }
+    }
+''')
+
+SUBMISSION_IDS = compile('''
+    query {
+      rounds(number: 0) {
+        leaderboard {
+          username
+          submissionId
+        }
+      }
+    }
+''')
+
+COMPETITIONS = compile('''
+    query {
+      rounds {
+        number
+        resolveTime
+        datasetId
+        openTime
+        resolvedGeneral
+        resolvedStaking
+      }
+    }
+''')
+
+SUBMISSION = compile('''
+    query($submission_id: String!) {
+      submissions(id: $submission_id) {
+        originality {
+          pending
+          value
+        }
+        concordance {
+          pending
+          value
+        }
+        consistency
+        validation_logloss
+      }
+    }
+''')
+
+STAKING_LEADERBOARD = compile('''
+    query($number: Int!) {
+      rounds(number: $number) {
+        leaderboard {
+          consistency
+          liveLogloss
+          username
+          validationLogloss
+          stake {
+            insertedAt
+            soc
+            confidence
+            value
+            txHash
+          }
+        }
+      }
+    }
+''')
+
+DATASET = compile('query {dataset}')
+
+SUBMISSION_UPLOAD_AUTH = compile('''
+    query($filename: String!) {
+      submission_upload_auth(filename: $filename) {
+        filename
+        url
+      }
+    }
+''')
+
+CREATE_SUBMISSION = compile('''
+    mutation($filename: String!) {
+      create_submission(filename: $filename) {
+        id
+      }
+    }
+''')
+
+LEADERBOARD = compile('''
+    query($number: Int!) {
+      rounds(number: $number) {
+        leaderboard {
+          consistency
+          concordance {
+            pending
+            value
+          }
+          originality {
+            pending
+            value
+          }
+          liveLogloss
+          submissionId
+          username
+          validationLogloss
+          paymentGeneral {
+            nmrAmount
+            usdAmount
+          }
+          paymentStaking {
+            nmrAmount
+            usdAmount
+          }
+          totalPayments {
+            nmrAmount
+            usdAmount
+          }
+        }
+      }
+    }
+''')
+
+PAYMENTS = compile('''
+    query {
+      user {
+        payments {
+          nmrAmount
+          round {
+            number
+            openTime
+            resolveTime
+            resolvedGeneral
+            resolvedStaking
+          }
+          tournament
+          usdAmount
+        }
+      }
+    }
+''')
+
+TRANSACTIONS = compile('''
+    query {
+      user {
+        nmrDeposits {
+          from
+          id
+          posted
+          status
+          to
+          txHash
+          value
+        }
+        nmrWithdrawals {
+          from
+          id
+          posted
+          status
+          to
+          txHash
+          value
+        }
+        usdWithdrawals {
+          ethAmount
+          confirmTime
+          from
+          posted
+          sendTime
+          status
+          to
+          txHash
+          usdAmount
+        }
+      }
+    }
+''')
+
+STAKES = compile('''
+    query {
+      user {
+        stakeTxs {
+          confidence
+          insertedAt
+          roundNumber
+          soc
+          staker
+          status
+          txHash
+          value
+        }
+      }
+    }
+''')
+
+USER = compile('''
+    query {
+      user {
+        username
+        banned
+        assignedEthAddress
+        availableNmr
+        availableUsd
+        email
+        id
+        mfaEnabled
+        status
+        insertedAt
+        apiTokens {
+          name
+          public_id
+          scopes
+        }
+      }
+    }
+''')
+
+STAKE = compile('''
+    mutation($code: String
+             $confidence: String!
+             $password: String
+             $round: Int!
+             $value: String!) {
+      stake(code: $code
+            confidence: $confidence
+            password: $password
+            round: $round
+            value: $value) {
+        id
+        status
+        txHash
+        value
+      }
+    }
+''')
+
+
+# python types accepted for the built-in scalars; bool is not an Int
+_SCALARS = {
+    'Int': (int,),
+    'Float': (int, float),
+    'String': (str,),
+    'Boolean': (bool,),
+    'ID': (str, int),
+}
+_VARIABLE = re.compile(r'\$(\w+):([\w\[\]!]+)(=)?')
+
+
+@functools.lru_cache(maxsize=256)
+def signature(document: str) -> dict:
+    """variable name -> (GraphQL type, required) of the operation in `document`
+
+    a variable is required if its type is non-null and it has no default
+    """
+    text = compile(document).text
+    head = text.split('{', 1)[0]
+    if '(' not in head:
+        return {}
+    return {name: (type_, type_.endswith('!') and not default)
+            for name, type_, default in _VARIABLE.findall(head)}
+
+
+def check_variables(document: str, variables: dict = None):
+    """raise ValueError if `variables` do not fit the operation in `document`
+
+    checks that required variables are given, that no unknown ones are and
+    that values of the built-in scalar types have the right python type;
+    input objects and custom scalars are left to the server
+    """
+    variables = variables or {}
+    if not isinstance(variables, dict):
+        raise ValueError('variables must be a dict, not {}'.format(type(variables).__name__))
+    expected = signature(document)
+    unknown = set(variables) - set(expected)
+    if unknown:
+        raise ValueError('unknown variables: {}'.format(', '.join(sorted(unknown))))
+    for name, (type_, required) in expected.items():
+        if required and variables.get(name) is None:
+            raise ValueError('variable "{}" of type {} is required'.format(name, type_))
+        if name in variables and not _matches(type_, variables[name]):
+            raise ValueError('variable "{}" should be of type {} but was {!r}'.format(
+                name, type_, variables[name]))
+
+
+def _matches(type_: str, value) -> bool:
+    if type_.endswith('!'):
+        return value is not None and _matches(type_[:-1], value)
+    if value is None:
+        return True
+    if type_.startswith('['):
+        return isinstance(value, (list, tuple)) and \
+            all(_matches(type_[1:-1], item) for item in value)
+    accepted = _SCALARS.get(type_)
+    if accepted is None:
+        return True
+    if isinstance(value, bool) and bool not in accepted:
+        return False
+    return isinstance(value, accepted)
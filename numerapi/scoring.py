@@ -0,0 +1,135 @@
+"""local scoring of predictions on the validation eras
+
+Computes the `validation_logloss` and `consistency` values reported by
+`NumerAPI.submission_status` from the extracted tournament data, without
+uploading anything. Several candidate models are scored in parallel with a
+process pool.
+
+Requires numpy (`pip install numerapi[scoring]`).
+"""
+import csv
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# an era counts towards consistency if its logloss beats random guessing
+CONSISTENCY_THRESHOLD = -math.log(0.5)
+EPSILON = 1e-15
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('local scoring requires numpy: pip install numerapi[scoring]')
+
+
+class ValidationData(object):
+    """ids, eras and targets of the validation rows of the tournament data"""
+
+    def __init__(self, ids, eras, targets):
+        _require_numpy()
+        self.ids = np.asarray(ids)
+        self.era_names, self.era_index = np.unique(np.asarray(eras), return_inverse=True)
+        self.targets = np.asarray(targets, dtype=np.float64)
+
+    @classmethod
+    def from_csv(cls, tournament_data_path: str) -> 'ValidationData':
+        ids, eras, targets = [], [], []
+        with open(tournament_data_path, newline='') as fh:
+            for row in csv.DictReader(fh):
+                if row['data_type'] == 'validation':
+                    ids.append(row['id'])
+                    eras.append(row['era'])
+                    targets.append(float(row['target']))
+        return cls(ids, eras, targets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def align(self, predictions):
+        """probabilities in the order of the validation rows
+
+        predictions: path of a predictions CSV, a dict id -> probability or
+            an array already in validation row order
+        """
+        if isinstance(predictions, str):
+            with open(predictions, newline='') as fh:
+                predictions = {row['id']: float(row['probability']) for row in csv.DictReader(fh)}
+        if isinstance(predictions, dict):
+            try:
+                return np.fromiter((predictions[i] for i in self.ids),
+                                   dtype=np.float64, count=len(self.ids))
+            except KeyError as err:
+                raise ValueError('no prediction for validation id {}'.format(err)) from err
+        predictions = np.asarray(predictions, dtype=np.float64)
+        if predictions.shape != self.targets.shape:
+            raise ValueError('expected {} predictions, got {}'.format(
+                len(self.targets), predictions.shape[0]))
+        return predictions
+
+
+def score_array(data: ValidationData, probabilities) -> dict:
+    """score aligned probabilities, see `score`"""
+    p = np.clip(probabilities, EPSILON, 1 - EPSILON)
+    y = data.targets
+    losses = -(y * np.log(p) + (1 - y) * np.log(1 - p))
+
+    n_eras = len(data.era_names)
+    era_sums = np.bincount(data.era_index, weights=losses, minlength=n_eras)
+    era_counts = np.bincount(data.era_index, minlength=n_eras)
+    era_logloss = era_sums / era_counts
+
+    return {
+        'validation_logloss': float(losses.mean()),
+        'consistency': float(100 * np.mean(era_logloss < CONSISTENCY_THRESHOLD)),
+        'era_logloss': dict(zip(data.era_names.tolist(), era_logloss.tolist())),
+    }
+
+
+def score(predictions, tournament_data) -> dict:
+    """score predictions on the validation eras
+
+    predictions: predictions CSV path, dict id -> probability or array in
+        validation row order
+    tournament_data: path of `numerai_tournament_data.csv` or a loaded
+        `ValidationData`
+
+    returns a dict with "validation_logloss", "consistency" (percentage of
+    eras with a logloss below -ln(0.5)) and "era_logloss" (era -> logloss)
+    """
+    _require_numpy()
+    if isinstance(tournament_data, str):
+        tournament_data = ValidationData.from_csv(tournament_data)
+    return score_array(tournament_data, tournament_data.align(predictions))
+
+
+_worker_data = None
+
+
+def _init_worker(tournament_data):
+    global _worker_data  # pylint: disable=global-statement
+    _worker_data = tournament_data
+
+
+def _score_in_worker(predictions):
+    return score(predictions, _worker_data)
+
+
+def score_many(candidates, tournament_data, processes: int = None) -> list:
+    """score several candidate models in parallel
+
+    candidates: list of predictions, each as accepted by `score`
+    tournament_data: as for `score`, loaded once and sent to each worker
+    processes: number of worker processes, defaults to the number of CPUs
+
+    returns the results of `score` in the order of `candidates`
+    """
+    _require_numpy()
+    if isinstance(tournament_data, str):
+        tournament_data = ValidationData.from_csv(tournament_data)
+    with ProcessPoolExecutor(processes, initializer=_init_worker,
+                             initargs=(tournament_data,)) as pool:
+        return list(pool.map(_score_in_worker, candidates))
@@ -0,0 +1,171 @@
+"""era-sharded layout of the extracted dataset for distributed training
+
+`shard_dataset` rewrites each csv file written by `NumerAPI.unzip_data_set`
+with the rows of every era next to each other and stores a manifest with
+the row count, byte offset and length of each era. A node that trains on a
+range of eras reads only those bytes with `open_shards`; `assign` splits the
+eras of a table into contiguous ranges of similar row counts.
+
+    manifest = shard_dataset("numerai_dataset_20180101")
+    start, stop = assign(manifest, "training", node, n_nodes)
+    data = pandas.read_csv(open_shards("numerai_dataset_20180101/shards",
+                                       "training", start, stop))
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+
+MANIFEST = 'manifest.json'
+TABLE_FILES = {
+    'training': 'numerai_training_data.csv',
+    'tournament': 'numerai_tournament_data.csv',
+}
+
+
+def _era_column(header: bytes) -> int:
+    names = header.rstrip(b'\r\n').split(b',')
+    if b'era' not in names:
+        raise ValueError('no era column in header')
+    return names.index(b'era')
+
+
+def _shard_table(source: str, target: str) -> dict:
+    """group the rows of `source` by era into `target`, return the manifest entry"""
+    eras = {}
+    with open(source, 'rb') as src, tempfile.TemporaryDirectory(dir=os.path.dirname(target)) as tmp:
+        header = src.readline()
+        era_col = _era_column(header)
+        try:
+            for line in src:
+                if not line.strip():
+                    continue
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                era = line.split(b',', era_col + 1)[era_col].decode('utf-8')
+                shard = eras.get(era)
+                if shard is None:
+                    # one temporary file per era, in order of first appearance;
+                    # all are closed below
+                    fh = open(os.path.join(tmp, str(len(eras))), 'wb')  # pylint: disable=consider-using-with
+                    shard = eras[era] = {'era': era, 'rows': 0, 'fh': fh}
+                shard['fh'].write(line)
+                shard['rows'] += 1
+        finally:
+            for shard in eras.values():
+                shard['fh'].close()
+
+        shards = []
+        with open(target + '.part', 'wb') as out:
+            out.write(header)
+            for shard in eras.values():
+                offset = out.tell()
+                with open(shard['fh'].name, 'rb') as fh:
+                    shutil.copyfileobj(fh, out, 1 << 20)
+                shards.append({'era': shard['era'], 'rows': shard['rows'],
+                               'offset': offset, 'length': out.tell() - offset})
+        os.replace(target + '.part', target)
+    return {'file': os.path.basename(target), 'header_length': len(header), 'shards': shards}
+
+
+def shard_dataset(unzip_path: str, dest_path: str = None,
+                  tables=('training', 'tournament')) -> dict:
+    """write the era-grouped tables and their manifest
+
+    unzip_path: directory with the files written by `unzip_data_set`
+    dest_path: directory for the shards, defaults to `unzip_path`/shards
+
+    returns the manifest: table -> {"file", "header_length", "shards"}, with
+    one {"era", "rows", "offset", "length"} per era
+    """
+    dest_path = dest_path or os.path.join(unzip_path, 'shards')
+    os.makedirs(dest_path, exist_ok=True)
+    manifest = {}
+    for table in tables:
+        if table not in TABLE_FILES:
+            raise ValueError('unknown table {}, expected one of {}'.format(
+                table, ', '.join(TABLE_FILES)))
+        manifest[table] = _shard_table(os.path.join(unzip_path, TABLE_FILES[table]),
+                                       os.path.join(dest_path, TABLE_FILES[table]))
+    # written last, its presence means the shards are complete
+    path = os.path.join(dest_path, MANIFEST)
+    with open(path + '.part', 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(path + '.part', path)
+    return manifest
+
+
+def read_manifest(shards_path: str) -> dict:
+    with open(os.path.join(shards_path, MANIFEST)) as fh:
+        return json.load(fh)
+
+
+def assign(manifest: dict, table: str, node: int, nodes: int) -> (int, int):
+    """contiguous range of shard indices [start, stop) for `node` of `nodes`
+
+    shards are split so that each node gets about the same number of rows
+    """
+    if not 0 <= node < nodes:
+        raise ValueError('node must be in [0, {})'.format(nodes))
+    shards = manifest[table]['shards']
+    total = sum(shard['rows'] for shard in shards)
+    bounds, seen = [0], 0
+    for i, shard in enumerate(shards):
+        seen += shard['rows']
+        # end a range once its share of the rows is reached
+        while len(bounds) < nodes and seen >= total * len(bounds) / nodes:
+            bounds.append(i + 1)
+    bounds += [len(shards)] * (nodes + 1 - len(bounds))
+    return bounds[node], bounds[node + 1]
+
+
+class _RangeReader(io.RawIOBase):
+    """header of a sharded table followed by a byte range of its rows"""
+
+    def __init__(self, path: str, header_length: int, offset: int, length: int):
+        super().__init__()
+        # closed with the reader
+        self._fh = open(path, 'rb')  # pylint: disable=consider-using-with
+        self._header = self._fh.read(header_length)
+        self._fh.seek(offset)
+        self._remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        if self._header:
+            n = min(len(b), len(self._header))
+            b[:n], self._header = self._header[:n], self._header[n:]
+            return n
+        data = self._fh.read(min(len(b), self._remaining))
+        self._remaining -= len(data)
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+def open_shards(shards_path: str, table: str, start: int = 0, stop: int = None,
+                binary: bool = False):
+    """csv stream with the header and the rows of shards [start, stop)
+
+    only the bytes of these shards are read from disk. Returns a text stream,
+    or a binary one with `binary=True`; close it when done.
+    """
+    entry = read_manifest(shards_path)[table]
+    shards = entry['shards'][start:stop]
+    if shards:
+        offset = shards[0]['offset']
+        length = shards[-1]['offset'] + shards[-1]['length'] - offset
+    else:
+        offset = length = 0
+    raw = _RangeReader(os.path.join(shards_path, entry['file']), entry['header_length'],
+                       offset, length)
+    stream = io.BufferedReader(raw, 1 << 20)
+    if binary:
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
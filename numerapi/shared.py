@@ -0,0 +1,249 @@
+"""extracted dataset in shared memory for pools of training processes
+
+`share_dataset` parses the csv files written by `NumerAPI.unzip_data_set`
+once, chunk by chunk, into one `multiprocessing.shared_memory` block per
+table: a float32 feature matrix, float32 targets (NaN where the target is
+unknown), fixed width ids and integer codes for eras and data types. The
+returned
+`SharedDataset` has a small picklable `handle`; child processes call
+`handle.attach()` and get numpy arrays that view the same memory, nothing is
+copied or parsed again.
+
+Requires numpy (`pip install numerapi[scoring]`) and Python 3.8.
+"""
+import csv
+import itertools
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TABLE_FILES = {
+    'training': 'numerai_training_data.csv',
+    'tournament': 'numerai_tournament_data.csv',
+}
+# offsets of the arrays in a block are rounded up to this
+ALIGNMENT = 64
+# rows parsed at once, straight into the shared block
+CHUNK_ROWS = 10000
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('shared datasets require numpy: pip install numerapi[scoring]')
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError as err:  # python 3.7
+        raise RuntimeError('shared datasets require Python 3.8 or later') from err
+    return shared_memory
+
+
+class SharedTable(object):  # pylint: disable=too-few-public-methods
+    """arrays of one table, all in row order
+
+    ids: fixed width bytes
+    eras, data_types: int32 codes into `era_names` and `data_type_names`
+    targets: float32, NaN where unknown
+    features: float32 matrix of rows x `feature_names`
+    """
+
+    def __init__(self, arrays: dict, era_names: list, data_type_names: list, feature_names: list):
+        self.ids = arrays['ids']
+        self.eras = arrays['eras']
+        self.data_types = arrays['data_types']
+        self.targets = arrays['targets']
+        self.features = arrays['features']
+        self.era_names = era_names
+        self.data_type_names = data_type_names
+        self.feature_names = feature_names
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class TableHandle(object):  # pylint: disable=too-few-public-methods
+    """picklable description of a table in a shared memory block"""
+
+    def __init__(self, block_name: str, layout: list, era_names: list,
+                 data_type_names: list, feature_names: list):
+        self.block_name = block_name
+        # (array name, dtype str, shape, offset)
+        self.layout = layout
+        self.era_names = era_names
+        self.data_type_names = data_type_names
+        self.feature_names = feature_names
+
+    def view(self, block) -> SharedTable:
+        arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+                  for name, dtype, shape, offset in self.layout}
+        return SharedTable(arrays, self.era_names, self.data_type_names, self.feature_names)
+
+
+class DatasetHandle(object):  # pylint: disable=too-few-public-methods
+    """picklable reference to a `SharedDataset`, pass it to child processes"""
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+
+    def attach(self) -> 'SharedDataset':
+        """map the shared blocks into this process without copying"""
+        _require_numpy()
+        shared_memory = _shared_memory()
+        blocks = {name: shared_memory.SharedMemory(name=table.block_name)
+                  for name, table in self.tables.items()}
+        return SharedDataset(self, blocks, owner=False)
+
+
+class SharedDataset(object):
+    """tables of a dataset in shared memory
+
+    `tables` maps "training" and "tournament" to a `SharedTable`. The arrays
+    are only valid until `close`; references to them must be dropped before,
+    otherwise the block cannot be unmapped. The process that created the
+    dataset also frees the memory on `close`, attached processes only unmap.
+    """
+
+    def __init__(self, handle: DatasetHandle, blocks: dict, owner: bool):
+        self.handle = handle
+        self.owner = owner
+        self._blocks = blocks
+        self.tables = {name: table.view(blocks[name]) for name, table in handle.tables.items()}
+
+    def __getitem__(self, name: str) -> SharedTable:
+        return self.tables[name]
+
+    def close(self):
+        self.tables = {}
+        for block in self._blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _columns(header: list):
+    id_col, era_col, type_col = (header.index(c) for c in ('id', 'era', 'data_type'))
+    target_col = header.index('target') if 'target' in header else None
+    feature_cols = [i for i, name in enumerate(header) if name.startswith('feature')]
+    return id_col, era_col, type_col, target_col, feature_cols
+
+
+def _scan_table(path: str):
+    """header, number of rows and longest id in bytes, nothing else is kept"""
+    with open(path, newline='') as fh:
+        rows = csv.reader(fh)
+        header = next(rows)
+        id_col = header.index('id')
+        n_rows = id_width = 0
+        for row in rows:
+            n_rows += 1
+            id_width = max(id_width, len(row[id_col].encode('utf-8')))
+    return header, n_rows, id_width
+
+
+def _sorted_codes(codes, seen: dict) -> list:
+    """renumber `codes`, given in order of first appearance in `seen`, to
+    index the sorted names; returns those names"""
+    order = sorted(seen)
+    remap = np.empty(len(order), dtype=np.int32)
+    for new_code, name in enumerate(order):
+        remap[seen[name]] = new_code
+    if len(remap):
+        codes[...] = remap[codes]
+    return order
+
+
+def _fill_table(path: str, arrays: dict):
+    """parse the rows into `arrays` in chunks of `CHUNK_ROWS`
+
+    returns the era and data type names; the codes in `arrays` index them
+    in sorted order
+    """
+    eras, data_types = {}, {}
+    with open(path, newline='') as fh:
+        rows = csv.reader(fh)
+        id_col, era_col, type_col, target_col, feature_cols = _columns(next(rows))
+        start = 0
+        while True:
+            chunk = list(itertools.islice(rows, CHUNK_ROWS))
+            if not chunk:
+                break
+            stop = start + len(chunk)
+            arrays['ids'][start:stop] = [row[id_col].encode('utf-8') for row in chunk]
+            arrays['eras'][start:stop] = [eras.setdefault(row[era_col], len(eras))
+                                          for row in chunk]
+            arrays['data_types'][start:stop] = [data_types.setdefault(row[type_col], len(data_types))
+                                                for row in chunk]
+            if target_col is not None:
+                arrays['targets'][start:stop] = [row[target_col] or 'nan' for row in chunk]
+            arrays['features'][start:stop] = [[row[i] for i in feature_cols] for row in chunk]
+            start = stop
+
+    return _sorted_codes(arrays['eras'], eras), _sorted_codes(arrays['data_types'], data_types)
+
+
+def _share_table(shared_memory, path: str):
+    header, n_rows, id_width = _scan_table(path)
+    feature_cols = _columns(header)[4]
+    shapes = [
+        ('ids', np.dtype('S{}'.format(max(id_width, 1))), (n_rows,)),
+        ('eras', np.dtype(np.int32), (n_rows,)),
+        ('data_types', np.dtype(np.int32), (n_rows,)),
+        ('targets', np.dtype(np.float32), (n_rows,)),
+        ('features', np.dtype(np.float32), (n_rows, len(feature_cols))),
+    ]
+    layout, size = [], 0
+    for name, dtype, shape in shapes:
+        layout.append((name, dtype.str, shape, size))
+        size += -(-dtype.itemsize * int(np.prod(shape)) // ALIGNMENT) * ALIGNMENT
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+                  for name, dtype, shape, offset in layout}
+        arrays['targets'][...] = np.nan
+        era_names, type_names = _fill_table(path, arrays)
+        del arrays
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    feature_names = [header[i] for i in feature_cols]
+    return TableHandle(block.name, layout, era_names, type_names, feature_names), block
+
+
+def share_dataset(unzip_path: str, tables=('training', 'tournament')) -> SharedDataset:
+    """load extracted csv files into shared memory
+
+    unzip_path: directory with the files written by `unzip_data_set`
+    tables: which of "training" and "tournament" to load
+
+    returns a `SharedDataset` owning the memory; use it as a context manager
+    or call `close` to free it
+    """
+    _require_numpy()
+    shared_memory = _shared_memory()
+    handles, blocks = {}, {}
+    try:
+        for name in tables:
+            if name not in TABLE_FILES:
+                raise ValueError('unknown table {}, expected one of {}'.format(
+                    name, ', '.join(TABLE_FILES)))
+            handles[name], blocks[name] = _share_table(
+                shared_memory, os.path.join(unzip_path, TABLE_FILES[name]))
+    except BaseException:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+        raise
+    return SharedDataset(DatasetHandle(handles), blocks, owner=True)
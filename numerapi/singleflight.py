@@ -0,0 +1,83 @@
+"""coalescing of identical concurrent calls
+
+Callers that ask for the same key while a call for it is in flight wait for
+that call and receive its result (or exception) instead of making their own.
+Whenever a result is shared, every caller gets its own deep copy, so that
+callers can modify what they get without affecting each other.
+
+Callers that wait honour their own `deadline`: once it has passed they raise
+TimeoutError, while the call they waited for goes on for the others.
+"""
+import asyncio
+import copy
+import threading
+
+from numerapi import deadline
+
+
+class _Call(object):  # pylint: disable=too-few-public-methods
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+
+    def do(self, key, func):
+        """return `func()`, sharing the call with concurrent callers of `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(deadline.remaining()):
+                raise TimeoutError('deadline exceeded')
+        else:
+            try:
+                call.result = func()
+            except Exception as err:  # pylint: disable=broad-except
+                call.error = err
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        # nobody can join once the call is removed; the original result is
+        # only handed out if nobody else will read it
+        if leader and not call.waiters:
+            return call.result
+        return copy.deepcopy(call.result)
+
+    async def do_async(self, key, func, executor=None):
+        """asyncio version of `do`, `func` is run in `executor` (default: the
+        loop's default executor)
+
+        coroutines of one event loop share an asyncio future; the executor
+        call goes through `do`, so it is also shared with threads and other
+        event loops. Each coroutine gets a deep copy of the result.
+        """
+        left = deadline.remaining()
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._async_calls.get(flight_key)
+        if future is None:
+            future = loop.run_in_executor(executor, self.do, key, func)
+            self._async_calls[flight_key] = future
+            future.add_done_callback(lambda _: self._async_calls.pop(flight_key, None))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), left)
+        except asyncio.TimeoutError:
+            raise TimeoutError('deadline exceeded') from None
+        return copy.deepcopy(result)
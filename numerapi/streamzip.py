@@ -0,0 +1,164 @@
+"""sequential reading of zip archives from a non-seekable stream
+
+`zipfile` needs the central directory at the end of the archive. Reading the
+local file headers instead allows members to be decompressed while the
+archive is still arriving over the network.
+"""
+import io
+import struct
+import zlib
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+LOCAL_SIGNATURE = b'PK\x03\x04'
+DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+STORED = 0
+DEFLATED = 8
+FLAG_DESCRIPTOR = 0x08
+ZIP64_EXTRA = 0x0001
+
+
+class _Input(object):
+    """buffered reader over a raw stream that can push data back"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.buffer = b''
+
+    def read(self, n: int) -> bytes:
+        """up to n bytes, less only at the end of the stream"""
+        while len(self.buffer) < n:
+            chunk = self.raw.read(max(n - len(self.buffer), 1 << 16))
+            if not chunk:
+                break
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def read_some(self, n: int) -> bytes:
+        """up to n bytes, as much as is available without blocking twice"""
+        if not self.buffer:
+            self.buffer = self.raw.read(n)
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def unread(self, data: bytes):
+        self.buffer = data + self.buffer
+
+
+class ZipMemberReader(io.RawIOBase):  # pylint: disable=too-many-instance-attributes
+    """decompressed content of one member, must be read before the next"""
+
+    def __init__(self, source: _Input, name: str, method: int, flags: int,
+                 compressed_size: int, crc: int):
+        super().__init__()
+        self.name = name
+        self._source = source
+        self._method = method
+        self._descriptor = bool(flags & FLAG_DESCRIPTOR)
+        self._remaining = None if self._descriptor else compressed_size
+        self._crc = crc
+        self._running_crc = 0
+        self._compressed = 0
+        self._size = 0
+        self._decompressor = zlib.decompressobj(-15) if method == DEFLATED else None
+        self._pending = b''
+        self._finished = False
+        if method not in (STORED, DEFLATED):
+            raise ValueError('unsupported compression method {} for {}'.format(method, name))
+        if method == STORED and self._descriptor:
+            raise ValueError('cannot stream stored member {} with unknown size'.format(name))
+
+    def readable(self):
+        return True
+
+    @property
+    def crc(self) -> int:
+        """CRC-32 of the content read so far, checked against the archive's
+        once the member is read to the end"""
+        return self._running_crc
+
+    @property
+    def size(self) -> int:
+        """bytes of content read so far"""
+        return self._size
+
+    def _fill(self, size: int):
+        while not self._pending and not self._finished:
+            want = 1 << 16 if self._remaining is None else min(1 << 16, self._remaining)
+            chunk = self._source.read_some(want) if want else b''
+            if self._remaining is not None:
+                self._remaining -= len(chunk)
+            if self._decompressor is None:
+                self._pending = chunk
+                self._finished = self._remaining == 0
+            else:
+                self._pending = self._decompressor.decompress(chunk)
+                self._compressed += len(chunk)
+                if self._decompressor.eof:
+                    unused = self._decompressor.unused_data
+                    self._compressed -= len(unused)
+                    self._source.unread(unused)
+                    self._finished = True
+                elif not chunk:
+                    raise EOFError('archive ended inside {}'.format(self.name))
+            self._size += len(self._pending)
+            self._running_crc = zlib.crc32(self._pending, self._running_crc)
+        if self._finished and not self._pending:
+            self._close_member()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def _close_member(self):
+        if self._descriptor:
+            head = self._source.read(4)
+            if head != DESCRIPTOR_SIGNATURE:
+                self._source.unread(head)
+            self._crc, compressed_size, size = struct.unpack('<III', self._source.read(12))
+            if (compressed_size, size) != (self._compressed & 0xFFFFFFFF, self._size & 0xFFFFFFFF):
+                # zip64 descriptor with 8 byte sizes
+                self._source.read(8)
+            self._descriptor = False
+        if self._crc != self._running_crc:
+            raise ValueError('bad CRC-32 for zip member {}'.format(self.name))
+
+    def readinto(self, b) -> int:
+        data = self._fill(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def drain(self):
+        while self.read(1 << 16):
+            pass
+
+
+def iter_members(raw):
+    """yield a `ZipMemberReader` for each member of the zip read from `raw`
+
+    raw: object with a `read(n)` method, e.g. an HTTP response body. Each
+    member is drained automatically when the next one is requested.
+    """
+    source = _Input(raw)
+    while True:
+        header = source.read(LOCAL_HEADER.size)
+        if len(header) < LOCAL_HEADER.size or header[:4] != LOCAL_SIGNATURE:
+            return
+        (_, _, flags, method, _, _, crc, compressed_size, _,
+         name_length, extra_length) = LOCAL_HEADER.unpack(header)
+        name = source.read(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = source.read(extra_length)
+        if compressed_size == 0xFFFFFFFF:
+            compressed_size = _zip64_compressed_size(extra)
+        member = ZipMemberReader(source, name, method, flags, compressed_size, crc)
+        yield member
+        member.drain()
+
+
+def _zip64_compressed_size(extra: bytes) -> int:
+    offset = 0
+    while offset + 4 <= len(extra):
+        field, size = struct.unpack('<HH', extra[offset:offset + 4])
+        if field == ZIP64_EXTRA:
+            # uncompressed size first, then compressed size
+            return struct.unpack('<Q', extra[offset + 12:offset + 20])[0]
+        offset += 4 + size
+    raise ValueError('zip64 member without zip64 extra field')
@@ -0,0 +1,85 @@
+"""local record of uploaded predictions, to skip identical re-uploads
+
+`NumerAPI(upload_record=path)` hashes each predictions file as it is read for
+uploading. If the same account already uploaded a file with the same SHA-256
+in the same round, the submission id of that upload is returned instead of
+uploading again. The round is the one of the latest dataset download, which
+is stored in the record as well, so uploading needs no extra request. The
+record is a small JSON file that several processes can share.
+"""
+import contextlib
+import hashlib
+import json
+import os
+
+from numerapi.locking import file_lock
+
+# rounds kept per account, older ones are dropped from the record
+KEEP_ROUNDS = 10
+
+
+def content_hash(data: bytes) -> str:
+    """hex SHA-256 of `data`"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadRecord(object):
+    """round of the latest dataset download and account -> round -> content
+    hash -> submission id, stored in `path`
+
+    the record is only read and changed within `locked`
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._record = None
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return {'round': None, 'accounts': {}}
+
+    def _save(self):
+        tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp, 'w') as fh:
+            json.dump(self._record, fh)
+        os.replace(tmp, self.path)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """hold the record's lock file in the block, so that a check, the
+        upload and adding it are not interleaved with other processes"""
+        with file_lock(self.path + '.lock'):
+            self._record = self._load()
+            try:
+                yield self
+            finally:
+                self._record = None
+
+    def _locked_record(self) -> dict:
+        if self._record is None:
+            raise RuntimeError('the upload record is only available within `locked`')
+        return self._record
+
+    @property
+    def round(self):
+        """round of the latest dataset download, None if unknown"""
+        return self._locked_record()['round']
+
+    def set_round(self, round_num: int):
+        self._locked_record()['round'] = round_num
+        self._save()
+
+    def get(self, account: str, round_num: int, digest: str):
+        """submission id of an earlier upload of `digest`, None if there is none"""
+        accounts = self._locked_record()['accounts']
+        return accounts.get(account, {}).get(str(round_num), {}).get(digest)
+
+    def add(self, account: str, round_num: int, digest: str, submission_id: str):
+        rounds = self._locked_record()['accounts'].setdefault(account, {})
+        rounds.setdefault(str(round_num), {})[digest] = submission_id
+        for old in sorted(rounds, key=int)[:-KEEP_ROUNDS]:
+            del rounds[old]
+        self._save()
@@ -0,0 +1,233 @@
+"""per-user lookup of leaderboard results over many rounds
+
+`UserIndex` keeps the tracked fields of the leaderboards of several rounds
+and maps each username and `submissionId` to the position of its row in
+every round, so the history of one user is a dictionary lookup instead of a
+scan of all leaderboards. Rows are stored positionally: per round a list of
+user numbers (the position in it is the row) and one list of values per
+tracked field, with each username stored once for all rounds. `update`
+fetches only rounds that are new or not resolved yet; `save` and `load` keep
+the index between runs in one gzipped JSON file of that layout.
+"""
+import gzip
+import json
+import os
+import threading
+
+# dotted paths of the leaderboard values that are kept
+DEFAULT_FIELDS = (
+    'submissionId', 'liveLogloss', 'validationLogloss', 'consistency',
+    'concordance.pending', 'concordance.value',
+    'originality.pending', 'originality.value',
+    'paymentGeneral.nmrAmount', 'paymentGeneral.usdAmount',
+    'paymentStaking.nmrAmount', 'paymentStaking.usdAmount',
+    'totalPayments.nmrAmount', 'totalPayments.usdAmount',
+)
+DEFAULT_STAKE_FIELDS = ('soc', 'confidence', 'value', 'txHash', 'insertedAt')
+
+
+def _lookup(row: dict, path: str):
+    """value at `path` and whether it is present; below a nested dict that
+    is None every value is None"""
+    for key in path.split('.'):
+        if row is None:
+            return None, True
+        if not isinstance(row, dict) or key not in row:
+            return None, False
+        row = row[key]
+    return row, True
+
+
+def _columns(rows: list, fields: tuple) -> dict:
+    """field -> list of values, for the fields present in any row"""
+    columns = {}
+    for position, row in enumerate(rows):
+        for field in fields:
+            value, present = _lookup(row, field)
+            if present:
+                columns.setdefault(field, [None] * len(rows))[position] = value
+    return columns
+
+
+def _rebuild(columns: dict, position: int) -> dict:
+    """nested row from the values at `position`; a nested dict whose values
+    are all None is None itself"""
+    row = {}
+    for field, values in columns.items():
+        *parents, name = field.split('.')
+        target = row
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = values[position]
+    return {key: None if isinstance(value, dict) and all(v is None for v in value.values())
+            else value for key, value in row.items()}
+
+
+class _Round(object):  # pylint: disable=too-few-public-methods
+    """rows of one round: `users[i]` is the user number of row i"""
+
+    def __init__(self, users: list, columns: dict, stake_users: list, stake_columns: dict,
+                 resolved: bool):
+        self.users = users
+        self.columns = columns
+        self.stake_rows = {user: position for position, user in enumerate(stake_users)}
+        self.stake_users = stake_users
+        self.stake_columns = stake_columns
+        self.resolved = resolved
+
+
+class UserIndex(object):
+    """tracked leaderboard values of many rounds, indexed by username and
+    submission id
+
+    fields: dotted paths of the leaderboard values to keep
+    stake_fields: keys of the staking leaderboard's `stake` to keep
+    """
+
+    def __init__(self, fields=DEFAULT_FIELDS, stake_fields=DEFAULT_STAKE_FIELDS):
+        self.fields = tuple(fields)
+        self.stake_fields = tuple(stake_fields)
+        self._lock = threading.Lock()
+        self._rounds = {}
+        # usernames, each stored once; a user number is a position in it
+        self._usernames = []
+        self._user_numbers = {}
+        # user number -> {round: position}, submissionId -> (round, position)
+        self._by_user = {}
+        self._by_submission = {}
+
+    @property
+    def rounds(self) -> list:
+        with self._lock:
+            return sorted(self._rounds)
+
+    def _user_number(self, username: str) -> int:
+        number = self._user_numbers.get(username)
+        if number is None:
+            number = self._user_numbers[username] = len(self._usernames)
+            self._usernames.append(username)
+        return number
+
+    def add_round(self, round_num: int, leaderboard: list, staking_leaderboard: list = None,
+                  resolved: bool = False):
+        """add or replace the rows of a round
+
+        round_num: round number
+        leaderboard: rows as returned by `NumerAPI.get_leaderboard`
+        staking_leaderboard: rows as returned by
+            `NumerAPI.get_staking_leaderboard` (optional)
+        resolved: the round will not change anymore, `update` skips it
+        """
+        stakes = [row for row in staking_leaderboard or () if row.get('stake') is not None]
+        columns = _columns(leaderboard, self.fields)
+        stake_columns = _columns([row['stake'] for row in stakes], self.stake_fields)
+        with self._lock:
+            users = [self._user_number(row['username']) for row in leaderboard]
+            stake_users = [self._user_number(row['username']) for row in stakes]
+            self._set_round(round_num, _Round(users, columns, stake_users, stake_columns,
+                                              resolved))
+
+    def _set_round(self, round_num: int, new: _Round):
+        self._remove(round_num)
+        self._rounds[round_num] = new
+        submission_ids = new.columns.get('submissionId', ())
+        for position, user in enumerate(new.users):
+            self._by_user.setdefault(user, {})[round_num] = position
+        for position, submission_id in enumerate(submission_ids):
+            if submission_id:
+                self._by_submission[submission_id] = (round_num, position)
+
+    def _remove(self, round_num: int):
+        old = self._rounds.pop(round_num, None)
+        if old is None:
+            return
+        for user in old.users:
+            rounds = self._by_user.get(user)
+            if rounds is not None:
+                rounds.pop(round_num, None)
+                if not rounds:
+                    del self._by_user[user]
+        for submission_id in old.columns.get('submissionId', ()):
+            if self._by_submission.get(submission_id, (None,))[0] == round_num:
+                del self._by_submission[submission_id]
+
+    def update(self, api, since: int = 0, staking: bool = False) -> list:
+        """fetch the rounds from `since` on that are missing or unresolved
+
+        api: `NumerAPI` instance
+        staking: also fetch the staking leaderboards
+
+        returns the numbers of the fetched rounds
+        """
+        with self._lock:
+            done = {n for n, stored in self._rounds.items() if stored.resolved}
+        fetched = []
+        for competition in api.get_competitions():
+            round_num = competition['number']
+            if round_num < since or round_num in done:
+                continue
+            leaderboard = api.get_leaderboard(round_num)
+            stakes = api.get_staking_leaderboard(round_num) if staking else None
+            self.add_round(round_num, leaderboard, stakes,
+                           resolved=bool(competition['resolvedGeneral']))
+            fetched.append(round_num)
+        return fetched
+
+    def _row(self, round_num: int, position: int) -> dict:
+        stored = self._rounds[round_num]
+        user = stored.users[position]
+        row = {'username': self._usernames[user], **_rebuild(stored.columns, position),
+               'round': round_num}
+        stake = stored.stake_rows.get(user)
+        if stake is not None:
+            row['stake'] = _rebuild(stored.stake_columns, stake)
+        return row
+
+    def user_history(self, username: str) -> list:
+        """rows of `username` in round order, each with "round" and, if
+        staking leaderboards were added, "stake" set
+
+        rows hold the tracked fields only
+        """
+        with self._lock:
+            rounds = self._by_user.get(self._user_numbers.get(username), {})
+            return [self._row(round_num, rounds[round_num]) for round_num in sorted(rounds)]
+
+    def find_submission(self, submission_id: str):
+        """leaderboard row of a submission with "round" set, or None"""
+        with self._lock:
+            found = self._by_submission.get(submission_id)
+            if found is None:
+                return None
+            return self._row(*found)
+
+    def save(self, path: str):
+        """write the index to a gzipped JSON file, atomically"""
+        with self._lock:
+            state = {
+                'fields': self.fields,
+                'stake_fields': self.stake_fields,
+                'usernames': self._usernames,
+                'rounds': [[n, r.resolved, r.users, r.columns, r.stake_users, r.stake_columns]
+                           for n, r in sorted(self._rounds.items())],
+            }
+            data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        with gzip.open(path + '.part', 'wb') as fh:
+            fh.write(data)
+        os.replace(path + '.part', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'UserIndex':
+        """index written by `save`, an empty one if `path` does not exist"""
+        if not os.path.exists(path):
+            return cls()
+        with gzip.open(path, 'rb') as fh:
+            state = json.loads(fh.read().decode('utf-8'))
+        index = cls(state['fields'], state['stake_fields'])
+        # pylint: disable=protected-access
+        index._usernames = state['usernames']
+        index._user_numbers = {name: i for i, name in enumerate(index._usernames)}
+        for round_num, resolved, users, columns, stake_users, stake_columns in state['rounds']:
+            index._set_round(round_num, _Round(users, columns, stake_users, stake_columns,
+                                               resolved))
+        return index
@@ -0,0 +1,16 @@
+"""helpers shared by the output formats of the command line and columnar"""
+import json
+
+
+def flatten(record: dict, prefix: str = '') -> dict:
+    """flatten nested dicts to dotted keys, lists are JSON encoded"""
+    flat = {}
+    for key, value in record.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, list):
+            flat[name] = json.dumps(value)
+        else:
+            flat[name] = value
+    return flat
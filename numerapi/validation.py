@@ -0,0 +1,103 @@
+"""local checks of prediction files before they are uploaded"""
+import functools
+import io
+import math
+import mmap
+import os
+
+REQUIRED_COLUMNS = (b'id', b'probability')
+
+
+def _scan_columns(readline, path: str, names: tuple) -> tuple:
+    header = readline().strip().split(b',')
+    wanted = [(name, header.index(name)) for name in names if name in header]
+    columns = {name: [] for name, _ in wanted}
+    last = max((index for _, index in wanted), default=0)
+    for number, line in enumerate(iter(readline, b''), 2):
+        line = line.rstrip(b'\r\n')
+        if not line:
+            continue
+        fields = line.split(b',', last + 1)
+        if len(fields) <= last:
+            raise ValueError('{} line {} has too few fields'.format(path, number))
+        for name, index in wanted:
+            columns[name].append(fields[index])
+    return header, columns
+
+
+def _read_columns(path: str, names: tuple, data: bytes = None) -> tuple:
+    """header and the values of the columns `names` present in the header
+
+    the file is scanned line by line through a memory map, or `data` if the
+    file was read already, so only the requested columns are kept in memory.
+    Raises ValueError for rows with fewer fields than the header needs.
+    """
+    if data is not None:
+        if not data:
+            return [], {}
+        return _scan_columns(io.BytesIO(data).readline, path, names)
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return [], {}
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _scan_columns(mm.readline, path, names)
+
+
+@functools.lru_cache(maxsize=4)
+def _tournament_ids(path: str, mtime_ns: int, size: int) -> frozenset:  # pylint: disable=unused-argument
+    _, columns = _read_columns(path, (b'id',))
+    return frozenset(columns.get(b'id', ()))
+
+
+def tournament_ids(path: str) -> frozenset:
+    """ids in `numerai_tournament_data.csv`, cached until the file changes"""
+    stat = os.stat(path)
+    return _tournament_ids(path, stat.st_mtime_ns, stat.st_size)
+
+
+def validate_predictions(file_path: str, tournament_data_path: str = None,
+                         data: bytes = None) -> None:
+    """raise ValueError if the predictions file would be rejected
+
+    file_path: CSV file with predictions
+    tournament_data_path: extracted `numerai_tournament_data.csv`; if given,
+        the predictions must contain exactly its ids
+    data: contents of `file_path` if already read, the file is then not read
+    """
+    try:
+        header, columns = _read_columns(file_path, REQUIRED_COLUMNS, data)
+    except ValueError as err:
+        raise ValueError('predictions file {} is malformed: {}'.format(file_path, err)) from err
+    if not header:
+        raise ValueError('predictions file {} is empty'.format(file_path))
+
+    missing_columns = [c.decode() for c in REQUIRED_COLUMNS if c not in header]
+    if missing_columns:
+        raise ValueError('predictions file {} lacks the column(s) {}'.format(
+            file_path, ', '.join(missing_columns)))
+
+    ids = columns[b'id']
+    try:
+        probabilities = list(map(float, columns[b'probability']))
+    except ValueError as err:
+        raise ValueError('predictions file {} has malformed probabilities'.format(file_path)) from err
+
+    if not ids:
+        raise ValueError('predictions file {} has no predictions'.format(file_path))
+    # min and max are unreliable in the presence of NaN
+    if not (0 < min(probabilities) and max(probabilities) < 1) or \
+            any(map(math.isnan, probabilities)):
+        raise ValueError('predictions in {} must be within (0, 1)'.format(file_path))
+
+    unique_ids = set(ids)
+    if len(unique_ids) != len(ids):
+        raise ValueError('predictions file {} has {} duplicate id(s)'.format(
+            file_path, len(ids) - len(unique_ids)))
+
+    if tournament_data_path is not None:
+        expected = tournament_ids(tournament_data_path)
+        missing = len(expected - unique_ids)
+        unknown = len(unique_ids - expected)
+        if missing or unknown:
+            raise ValueError('predictions file {} has {} missing and {} unknown id(s)'.format(
+                file_path, missing, unknown))
@@ -11,10 +11,19 @@ setup(
     packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
     include_package_data=True,
     zip_safe=False,
+    python_requires=">=3.7",
     install_requires=[
         "requests",
         "zope.interface",
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "scoring": ["numpy"],
+        "http2": ["httpx[http2]"],
+    },
+    entry_points={
+        "console_scripts": ["numerapi = numerapi.cli:main"],
+    },
     test_requires=[
         "pytest",
     ]
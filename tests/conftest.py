@@ -0,0 +1,11 @@
+import zipfile
+
+import pytest
+
+
+@pytest.fixture(name='tournament_data', scope='module')
+def fixture_for_tournament_data(tmpdir_factory):
+    path = tmpdir_factory.mktemp('data')
+    with zipfile.ZipFile('tests/data/numerai_dataset.zip') as z:
+        z.extract('numerai_dataset/numerai_tournament_data.csv', str(path))
+    return str(path.join('numerai_dataset', 'numerai_tournament_data.csv'))
@@ -0,0 +1,288 @@
+import os
+
+import pytest
+
+from benchmarks.server import MockNumeraiServer, write_predictions
+from numerapi import NumerAPI, queries
+from numerapi.api_manager import NumerApiManager
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=50, dataset_rows=20) as server:
+        yield server
+
+
+@pytest.fixture(name='api', scope='function')
+def fixture_for_api(server: MockNumeraiServer):
+    return NumerAPI(public_id='foo', secret_key='bar',
+                    manager=NumerApiManager(api_url=server.url))
+
+
+def test_raw_query(api: NumerAPI, server: MockNumeraiServer):
+    result = api.manager.raw_query('query {dataset}')
+    assert result['data']['dataset'].startswith(server.url.rstrip('/'))
+
+
+def test_get_leaderboard(api: NumerAPI):
+    lb = api.get_leaderboard(0)
+    assert len(lb) == 50
+
+
+def test_download_and_upload(api: NumerAPI, server: MockNumeraiServer, tmpdir):
+    path = api.download_current_dataset(dest_path=str(tmpdir), dest_filename='ds.zip')
+    tourn_file = os.path.join(str(tmpdir), 'ds', 'numerai_tournament_data.csv')
+    assert os.path.exists(path)
+    assert os.path.exists(tourn_file)
+
+    predictions = os.path.join(str(tmpdir), 'predictions.csv')
+    write_predictions(tourn_file, predictions)
+    submission_id = api.upload_predictions(predictions, tournament_data_path=tourn_file)
+    assert submission_id
+    assert server.uploads[-1] == os.path.getsize(predictions)
+
+
+def test_invalid_predictions_are_not_sent(api: NumerAPI, server: MockNumeraiServer, tmpdir):
+    predictions = tmpdir.join('predictions.csv')
+    predictions.write('id,probability\n1,1.5\n')
+    before = server.requests
+    with pytest.raises(ValueError):
+        api.upload_predictions(str(predictions))
+    assert server.requests == before
+
+
+def test_invalid_calls_are_not_sent(api: NumerAPI, server: MockNumeraiServer):
+    anonymous = NumerAPI(manager=NumerApiManager(api_url=server.url))
+    before = server.requests
+    with pytest.raises(ValueError):
+        anonymous.get_payments()
+    with pytest.raises(ValueError):
+        api.manager.raw_query(queries.LEADERBOARD.text, {'number': '80'})
+    with pytest.raises(ValueError):
+        api.manager.get_submission(None)
+    assert server.requests == before
+
+
+def test_unsupported_query_raises(api: NumerAPI):
+    with pytest.raises(ValueError):
+        api.manager.raw_query('query {nonsense}')
+
+
+def test_concurrent_identical_queries_share_one_request(api: NumerAPI, server: MockNumeraiServer):
+    from concurrent.futures import ThreadPoolExecutor
+
+    server.delay = 0.2
+    before = server.requests
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            rounds = list(pool.map(lambda _: api.get_current_round(), range(8)))
+    finally:
+        server.delay = 0
+    assert rounds == [90] * 8
+    assert server.requests - before == 1
+
+
+def test_concurrent_async_queries_share_one_request(api: NumerAPI, server: MockNumeraiServer):
+    import asyncio
+
+    async def query_many():
+        return await asyncio.gather(
+            *[api.manager.raw_query_async('query {dataset}') for _ in range(5)])
+
+    server.delay = 0.2
+    before = server.requests
+    try:
+        results = asyncio.run(query_many())
+    finally:
+        server.delay = 0
+    assert len(results) == 5
+    assert server.requests - before == 1
+
+
+def test_mutations_are_not_coalesced(api: NumerAPI):
+    assert api.manager._flight_key('mutation { foo }', None, True) is None  # pylint: disable=protected-access
+    assert api.manager._flight_key('query { foo }', None, False) is not None  # pylint: disable=protected-access
+
+
+def test_coalesced_callers_get_independent_results(api: NumerAPI, server: MockNumeraiServer):
+    from concurrent.futures import ThreadPoolExecutor
+
+    server.delay = 0.2
+    before = server.requests
+    try:
+        with ThreadPoolExecutor(4) as pool:
+            leaderboards = list(pool.map(lambda _: api.get_leaderboard(0), range(4)))
+    finally:
+        server.delay = 0
+    assert server.requests - before == 1
+    leaderboards[0].clear()
+    assert all(len(lb) == 50 for lb in leaderboards[1:])
+    assert len({id(lb) for lb in leaderboards}) == 4
+
+
+def test_http2_transport_falls_back_and_limits_streams(server: MockNumeraiServer):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    pytest.importorskip('httpx')
+    from numerapi.http2 import Http2Transport
+
+    transport = Http2Transport(max_streams=2)
+    api = NumerAPI(manager=NumerApiManager(api_url=server.url, transport=transport))
+    server.delay = 0.1
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(6) as pool:
+            leaderboards = list(pool.map(api.get_leaderboard, range(80, 86)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.delay = 0
+        transport.close()
+    assert all(len(lb) == 50 for lb in leaderboards)
+    # the mock server only speaks HTTP/1.1; two streams serve six queries
+    assert transport.http_version == 'HTTP/1.1'
+    assert elapsed >= 0.3
+
+
+def test_async_queries_use_all_streams(server: MockNumeraiServer):
+    import asyncio
+
+    pytest.importorskip('httpx')
+    from numerapi.http2 import Http2Transport
+
+    transport = Http2Transport(max_streams=100, timeout=5)
+    manager = NumerApiManager(api_url=server.url, transport=transport)
+
+    async def fetch_all():
+        return await asyncio.gather(*(manager.raw_query_async(
+            queries.LEADERBOARD.text, {'number': n}) for n in range(64)))
+
+    server.delay = 0.5
+    server.max_in_flight = 0
+    try:
+        results = asyncio.run(fetch_all())
+    finally:
+        server.delay = 0
+        transport.close()
+    assert len(results) == 64
+    # the default executor would run at most 32 of them at once
+    assert server.max_in_flight > 32
+    view = manager.with_token(('a', 'b'))
+    assert view._pool('async', 1) is manager._pool('async', 1)  # pylint: disable=protected-access
+
+
+def test_persisted_queries_send_hash_after_first_use():
+    with MockNumeraiServer(leaderboard_size=5, dataset_rows=20, persisted_queries=True) as server:
+        manager = NumerApiManager(api_url=server.url, persisted_queries=True)
+        api = NumerAPI(manager=manager)
+        assert len(api.get_leaderboard(0)) == 5
+        before = server.requests
+        assert len(api.get_leaderboard(0)) == 5
+        # one request carrying only the hash
+        assert server.requests - before == 1
+        assert server.persisted_hits == 1
+
+
+def test_persisted_queries_fall_back_without_server_support(api: NumerAPI):
+    api.manager.persisted_queries = True
+    assert len(api.get_leaderboard(0)) == 50
+    assert not api.manager.persisted_queries
+
+
+def test_accounts_share_one_manager(api: NumerAPI, tmpdir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    other = api.for_account('baz', 'qux')
+    assert other.manager.token == ('baz', 'qux')
+    assert api.manager.token == ('foo', 'bar')
+    assert other.manager.session is api.manager.session
+
+    api.download_current_dataset(dest_path=str(tmpdir), dest_filename='ds.zip')
+    tourn_file = os.path.join(str(tmpdir), 'ds', 'numerai_tournament_data.csv')
+    predictions = os.path.join(str(tmpdir), 'predictions.csv')
+    write_predictions(tourn_file, predictions)
+
+    with ThreadPoolExecutor(4) as pool:
+        ids = list(pool.map(lambda client: (client.upload_predictions(predictions),
+                                            client.submission_id),
+                            [api, other] * 4))
+    # each thread sees the id of its own last upload
+    assert all(uploaded == last for uploaded, last in ids)
+    assert api.submission_id is None
+
+
+def test_clients_do_not_recredential_a_shared_manager(server: MockNumeraiServer):
+    shared = NumerApiManager(api_url=server.url)
+    first = NumerAPI(public_id='a', secret_key='x', manager=shared)
+    second = NumerAPI(public_id='b', secret_key='y', manager=shared)
+    assert first.manager.token == ('a', 'x')
+    assert second.manager.token == ('b', 'y')
+    assert shared.token is None
+    assert first.manager.session is second.manager.session
+
+
+def test_deadline_bounds_queries(server: MockNumeraiServer):
+    import asyncio
+    import time
+
+    from numerapi.deadline import deadline
+
+    manager = NumerApiManager(api_url=server.url, coalesce=False)
+    api = NumerAPI(manager=manager)
+    server.delay = 0.5
+    try:
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError), deadline(0.1):
+            api.get_current_round()
+        assert time.perf_counter() - start < 0.4
+
+        async def query():
+            with deadline(0.1):
+                return await manager.raw_query_async('query {dataset}')
+        with pytest.raises(TimeoutError):
+            asyncio.run(query())
+    finally:
+        server.delay = 0
+
+
+def test_coalesced_caller_keeps_its_own_deadline(server: MockNumeraiServer):
+    import threading
+    import time
+
+    from numerapi.deadline import deadline
+
+    api = NumerAPI(manager=NumerApiManager(api_url=server.url))
+    server.delay = 0.5
+    before = server.requests
+    rounds = []
+    leader = threading.Thread(target=lambda: rounds.append(api.get_current_round()))
+    try:
+        leader.start()
+        time.sleep(0.1)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError), deadline(0.1):
+            api.get_current_round()
+        assert time.perf_counter() - start < 0.3
+        leader.join()
+    finally:
+        server.delay = 0
+    # the leader's request was not affected
+    assert rounds == [90]
+    assert server.requests - before == 1
+
+
+def test_hedged_query_takes_first_response(server: MockNumeraiServer):
+    import time
+
+    manager = NumerApiManager(api_url=server.url, hedge=True, hedge_after=0.05)
+    api = NumerAPI(manager=manager)
+    server.stalls = [2]
+    start = time.perf_counter()
+    assert api.get_current_round() == 90
+    assert time.perf_counter() - start < 1
+    assert manager.hedges == 1
+    # mutations are never sent twice
+    server.stalls = [0.2]
+    manager.raw_query('mutation($filename: String!) {create_submission(filename: $filename) {id}}',
+                      {'filename': 'x'})
+    assert manager.hedges == 1
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from benchmarks.kvserver import MockKeyValueServer
+from benchmarks.server import MockNumeraiServer
+from numerapi import NumerAPI
+from numerapi.api_manager import NumerApiManager
+from numerapi.cache import FileCache, MemoryCache, RedisCache
+
+
+@pytest.fixture(name='kv_server', scope='module')
+def fixture_for_kv_server():
+    with MockKeyValueServer() as server:
+        yield server
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=10, dataset_rows=20) as server:
+        yield server
+
+
+@pytest.fixture(name='cache', params=['memory', 'file', 'redis'])
+def fixture_for_cache(request, tmpdir, kv_server):
+    if request.param == 'memory':
+        return MemoryCache()
+    if request.param == 'file':
+        return FileCache(str(tmpdir.join('cache')))
+    return RedisCache(*kv_server.address, db=1)
+
+
+def test_values_expire(cache):
+    assert cache.get('a') is None
+    cache.set('a', b'1\n2', ttl=60)
+    cache.set('b', b'3', ttl=0.05)
+    assert cache.get('a') == b'1\n2'
+    time.sleep(0.1)
+    assert cache.get('b') is None
+
+
+def test_managers_share_results(server: MockNumeraiServer, kv_server: MockKeyValueServer):
+    workers = [NumerAPI(public_id='foo', secret_key='bar',
+                        manager=NumerApiManager(api_url=server.url,
+                                                cache=RedisCache(*kv_server.address)))
+               for _ in range(3)]
+    before = server.requests
+    results = [worker.get_competitions() for worker in workers]
+    assert server.requests - before == 1
+    assert results[0] == results[2]
+    results[0].clear()
+    assert workers[1].get_competitions() == results[2]
+
+    # results that need authorization are not shared
+    before = server.requests
+    for worker in workers:
+        worker.manager.raw_query('query {dataset}', authorization=True)
+    assert server.requests - before == 3
+
+
+def test_unreachable_cache_is_skipped(server: MockNumeraiServer):
+    cache = RedisCache('127.0.0.1', 1, timeout=0.1)
+    api = NumerAPI(manager=NumerApiManager(api_url=server.url, cache=cache))
+    assert api.get_current_round() == 90
@@ -0,0 +1,49 @@
+from numerapi import NumerAPI
+from numerapi.changefeed import LeaderboardFeed, INSERT, UPDATE, REMOVE
+from tests.test_numerapi import NumerMockManager
+
+
+def row(submission_id, live_logloss=None, concordance=False):
+    return {'submissionId': submission_id, 'liveLogloss': live_logloss,
+            'concordance': {'pending': False, 'value': concordance}}
+
+
+def test_update_reports_only_changes():
+    feed = LeaderboardFeed(api=None)
+    changes = feed.update([row('a'), row('b')])
+    assert sorted((c.kind, c.submission_id) for c in changes) == [(INSERT, 'a'), (INSERT, 'b')]
+
+    assert not feed.update([row('a'), row('b')])
+
+    changes = feed.update([row('a', 0.69, concordance=True), row('c')])
+    kinds = {c.submission_id: c for c in changes}
+    assert kinds['a'].kind == UPDATE
+    assert kinds['a'].fields == {'liveLogloss': (None, 0.69),
+                                 'concordance.value': (False, True)}
+    assert kinds['b'].kind == REMOVE
+    assert kinds['c'].kind == INSERT
+    assert len(feed) == 2
+
+
+def test_rows_without_submission_are_keyed_by_username():
+    feed = LeaderboardFeed(api=None)
+    rows = [{'submissionId': None, 'username': 'u1', 'liveLogloss': None},
+            {'username': 'u2', 'liveLogloss': None},
+            {'liveLogloss': 0.5}]
+    assert sorted(c.submission_id for c in feed.update(rows)) == ['u1', 'u2']
+    rows[1]['liveLogloss'] = 0.7
+    assert [(c.kind, c.submission_id) for c in feed.update(rows)] == [(UPDATE, 'u2')]
+
+
+def test_poll_uses_api():
+    manager = NumerMockManager()
+    manager.create_competition(1)
+    api = NumerAPI(manager=manager)
+    feed = LeaderboardFeed(api, round_num=1)
+    assert not feed.poll()
+
+    submission_id = api.upload_predictions('foo')
+    assert [(c.kind, c.submission_id) for c in feed.poll()] == [(INSERT, submission_id)]
+
+    manager.leaderboards[1].submissions[0].set_as_done()
+    assert [c.kind for c in feed.poll()] == [UPDATE]
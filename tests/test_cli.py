@@ -0,0 +1,98 @@
+# pylint: disable=redefined-outer-name
+import csv
+import json
+import os
+
+import pytest
+
+from benchmarks.server import MockNumeraiServer
+from numerapi import cli
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=10, dataset_rows=20) as server:
+        yield server
+
+
+def run(server, tmpdir, *argv) -> str:
+    output = str(tmpdir.join('out'))
+    assert cli.main(['--api-url', server.url, '-o', output] + list(argv)) == 0
+    with open(output) as fh:
+        return fh.read()
+
+
+def test_leaderboard_batch_ndjson(server, tmpdir):
+    lines = run(server, tmpdir, 'leaderboard', '67', '68').splitlines()
+    records = [json.loads(line) for line in lines]
+    assert len(records) == 20
+    assert [r['round'] for r in records] == [67] * 10 + [68] * 10
+
+
+def test_competitions_csv_is_flat(server, tmpdir):
+    rows = list(csv.DictReader(run(server, tmpdir, '--format', 'csv', 'competitions').splitlines()))
+    assert len(rows) == 90
+    assert 'resolveTime' in rows[0]
+
+
+def test_submit_for_each_account_in_config(server, tmpdir):
+    predictions = tmpdir.join('predictions.csv')
+    predictions.write('id,probability\n1,0.5\n')
+    config = tmpdir.join('accounts.ini')
+    config.write('[a]\npublic_id = a\nsecret_key = x\n'
+                 '[b]\npublic_id = b\nsecret_key = y\n')
+
+    lines = run(server, tmpdir, 'submit', str(predictions), '--config', str(config))
+    assert [json.loads(line)['account'] for line in lines.splitlines()] == ['a', 'b']
+
+
+def test_status_maps_each_id_to_its_account(server, tmpdir):
+    config = tmpdir.join('accounts.ini')
+    config.write('[a]\npublic_id = a\nsecret_key = x\n'
+                 '[b]\npublic_id = b\nsecret_key = y\n')
+    first, second = '00000000-0000-0000-0000-000000000001', '00000000-0000-0000-0000-000000000002'
+    before = server.requests
+    lines = run(server, tmpdir, 'status', 'a:' + first, 'b:' + second, '--config', str(config))
+    records = [json.loads(line) for line in lines.splitlines()]
+    assert sorted((r['account'], r['submission_id']) for r in records) == \
+        [('a', first), ('b', second)]
+    assert server.requests - before == 2
+
+    # a bare id is ambiguous with two accounts
+    assert cli.main(['--api-url', server.url, '-o', str(tmpdir.join('out')),
+                     'status', first, '--config', str(config)]) == 1
+
+
+def test_sync_skips_existing_leaderboards(server, tmpdir):
+    dest = str(tmpdir.join('sync'))
+    first = run(server, tmpdir, 'sync', dest, '--since', '88').splitlines()
+    assert len(first) == 4
+    assert os.path.exists(os.path.join(dest, 'leaderboard_90.ndjson'))
+
+    # only the open round 90 is fetched again
+    second = [json.loads(line) for line in
+              run(server, tmpdir, 'sync', dest, '--since', '88').splitlines()]
+    assert [r.get('round') for r in second] == [None, 90]
+
+
+def test_parquet_schema_waits_for_typed_values(tmpdir):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmpdir.join('out.parquet'))
+    with open(path, 'wb') as fh:
+        writer = cli.ParquetWriter(fh)
+        writer.write([{'round': 0, 'liveLogloss': None}])
+        writer.write([{'round': 67, 'liveLogloss': 0.69}])
+        writer.write([{'round': 68}])
+        writer.close()
+    table = pq.read_table(path)
+    assert table.column('liveLogloss').to_pylist() == [None, 0.69, None]
+
+
+def test_parquet_lossy_cast_raises(tmpdir):
+    pytest.importorskip('pyarrow')
+    with open(str(tmpdir.join('out.parquet')), 'wb') as fh:
+        writer = cli.ParquetWriter(fh)
+        writer.write([{'round': 1}])
+        with pytest.raises(ValueError):
+            writer.write([{'round': 1.5}])
+        writer.close()
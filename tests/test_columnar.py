@@ -0,0 +1,57 @@
+import socket
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+from numerapi import columnar  # noqa: E402  pylint: disable=wrong-import-position
+
+RECORDS = [
+    {'username': 'a', 'liveLogloss': None, 'submissionId': 'x',
+     'paymentGeneral': {'nmrAmount': '1.0', 'usdAmount': '2.0'}},
+    {'username': 'b', 'liveLogloss': None, 'submissionId': 'y',
+     'paymentGeneral': None},
+]
+
+
+def count_rows(handle):
+    shared = handle.attach()
+    try:
+        return shared.table.num_rows, shared.table.column('username').to_pylist()
+    finally:
+        shared.close()
+
+
+def test_record_batch_flattens_nested_records():
+    batch = columnar.record_batch(RECORDS)
+    assert batch.num_rows == 2
+    assert batch.column('paymentGeneral.usdAmount').to_pylist() == ['2.0', None]
+    assert pa.types.is_null(batch.schema.field('liveLogloss').type)
+
+
+def test_stream_to_file_and_socket(tmpdir):
+    batch = columnar.record_batch(RECORDS)
+    path = str(tmpdir.join('leaderboard.arrows'))
+    size = columnar.write_stream(batch, path)
+    assert size == tmpdir.join('leaderboard.arrows').size()
+    table = columnar.read_stream(path)
+    assert table.to_pylist() == pa.Table.from_batches([batch]).to_pylist()
+
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(target=lambda: (columnar.write_stream(batch, left),
+                                                  left.shutdown(socket.SHUT_WR)))
+        sender.start()
+        assert columnar.read_stream(right).equals(table)
+        sender.join()
+
+
+def test_shared_memory_between_processes():
+    pytest.importorskip('multiprocessing.shared_memory')
+    batch = columnar.record_batch(RECORDS)
+    with columnar.share(batch) as shared:
+        assert shared.table.num_rows == 2
+        with ProcessPoolExecutor(1) as pool:
+            assert pool.submit(count_rows, shared.handle).result() == (2, ['a', 'b'])
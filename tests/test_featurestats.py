@@ -0,0 +1,50 @@
+import zipfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from numerapi import featurestats  # noqa: E402  pylint: disable=wrong-import-position
+
+
+@pytest.fixture(name='unzip_path')
+def fixture_for_unzip_path(tmpdir):
+    with zipfile.ZipFile('tests/data/numerai_dataset.zip') as z:
+        with z.open('numerai_dataset/numerai_training_data.csv') as src:
+            tmpdir.join('numerai_training_data.csv').write_binary(src.read())
+    return str(tmpdir)
+
+
+def test_stats_match_direct_computation(unzip_path, monkeypatch):
+    # several byte ranges even for the small sample file
+    monkeypatch.setattr(featurestats, 'MIN_CHUNK', 10000)
+    stats = featurestats.compute_stats(unzip_path, processes=2)
+
+    with open(unzip_path + '/numerai_training_data.csv') as fh:
+        header = next(fh).strip().split(',')
+        rows = [line.strip().split(',') for line in fh]
+    eras = [row[1] for row in rows]
+    values = np.array([[float(v) for v in row[3:]] for row in rows])
+    assert stats.eras == sorted(set(eras), key=eras.index)
+    assert stats.features == header[3:-1]
+
+    for i, era in enumerate(stats.eras):
+        subset = values[[e == era for e in eras]]
+        x, y = subset[:, :-1], subset[:, -1]
+        assert stats.counts[i] == len(subset)
+        np.testing.assert_allclose(stats.mean[i], x.mean(axis=0), rtol=1e-5)
+        np.testing.assert_allclose(stats.std[i], x.std(axis=0), rtol=1e-4)
+        expected = [np.corrcoef(x[:, j], y)[0, 1] for j in range(x.shape[1])]
+        np.testing.assert_allclose(stats.target_corr[i], expected, rtol=1e-4, atol=1e-6)
+
+    loaded = featurestats.load_stats(unzip_path)
+    assert loaded.eras == stats.eras
+    np.testing.assert_array_equal(loaded.target_corr, stats.target_corr)
+    assert loaded.era('era1')['feature1'][0] == pytest.approx(float(stats.mean[0, 0]))
+    assert len(loaded.feature('feature2')['std']) == len(stats.eras)
+
+
+def test_missing_stats_are_computed_on_request(unzip_path):
+    with pytest.raises(FileNotFoundError):
+        featurestats.load_stats(unzip_path)
+    assert featurestats.load_stats(unzip_path, compute=True).features
@@ -0,0 +1,96 @@
+import decimal
+import os
+
+import pytest
+
+from numerapi import history
+from numerapi.history import HistoryExporter, to_columns
+
+pytest.importorskip('pyarrow')
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.payments = [{'nmrAmount': '1.5', 'usdAmount': '3.00', 'tournament': 'staking',
+                          'round': {'number': 80, 'openTime': '2017-11-04T00:00:00Z',
+                                    'resolveTime': '2017-12-04T00:00:00Z',
+                                    'resolvedGeneral': True, 'resolvedStaking': True}}]
+        self.transactions = {'nmrDeposits': [], 'usdWithdrawals': [], 'nmrWithdrawals': [
+            {'id': '1', 'txHash': '0xa', 'from': 'me', 'to': 'you', 'posted': True,
+             'status': 'done', 'value': '2'}]}
+        self.stakes = []
+
+    def get_payments(self):
+        return self.payments
+
+    def get_transactions(self):
+        return self.transactions
+
+    def get_stakes(self):
+        return self.stakes
+
+
+def test_to_columns_types_values():
+    columns = to_columns('payments', FakeAPI().payments)
+    assert columns['round_number'] == [80]
+    assert columns['nmr_amount'] == [decimal.Decimal('1.5')]
+    assert columns['round_open_time'][0].year == 2017
+
+
+def test_export_appends_only_new_records(tmpdir):
+    api = FakeAPI()
+    exporter = HistoryExporter(api, str(tmpdir))
+    assert exporter.export() == {'payments': 1, 'nmr_deposits': 0, 'nmr_withdrawals': 1,
+                                 'usd_withdrawals': 0, 'stakes': 0}
+    assert sum(exporter.export().values()) == 0
+
+    api.stakes = [{'txHash': '0xb', 'roundNumber': 81, 'staker': 'me', 'status': 'ok',
+                   'confidence': '0.5', 'soc': '10', 'value': '5',
+                   'insertedAt': '2017-12-05T10:00:00Z'}]
+    assert exporter.export()['stakes'] == 1
+
+    stakes = exporter.read('stakes')
+    assert stakes.num_rows == 1
+    assert stakes.column('round_number').to_pylist() == [81]
+    assert exporter.read('usd_withdrawals').num_rows == 0
+
+
+def test_records_without_key_wait_for_it(tmpdir):
+    api = FakeAPI()
+    pending = {'txHash': None, 'status': 'pending', 'usdAmount': '5'}
+    api.transactions['usdWithdrawals'] = [dict(pending), dict(pending, usdAmount='7')]
+    exporter = HistoryExporter(api, str(tmpdir))
+    assert exporter.export()['usd_withdrawals'] == 0
+
+    api.transactions['usdWithdrawals'][0]['txHash'] = '0xc'
+    assert exporter.export()['usd_withdrawals'] == 1
+    api.transactions['usdWithdrawals'][1]['txHash'] = '0xd'
+    assert exporter.export()['usd_withdrawals'] == 1
+    assert exporter.read('usd_withdrawals').column('tx_hash').to_pylist() == ['0xc', '0xd']
+
+
+def test_runs_read_the_key_index_and_compact_parts(tmpdir, monkeypatch):
+    monkeypatch.setattr(history, 'COMPACT_PARTS', 3)
+    api = FakeAPI()
+    exporter = HistoryExporter(api, str(tmpdir))
+    exporter.export()
+    # stored records are not read again to find the known keys
+    monkeypatch.setattr(exporter, '_read_keys', None)
+    for n in range(5):
+        api.stakes.append({'txHash': '0x{}'.format(n), 'roundNumber': 81 + n})
+        assert exporter.export()['stakes'] == 1
+
+    # the fourth part was merged with the first three
+    stakes_dir = str(tmpdir.join('stakes'))
+    assert len([name for name in os.listdir(stakes_dir) if name.endswith('.parquet')]) == 2
+    assert exporter.read('stakes').column('round_number').to_pylist() == [81, 82, 83, 84, 85]
+    assert len(exporter.known_keys('stakes')) == 5
+
+
+def test_index_is_rebuilt_from_parts(tmpdir):
+    api = FakeAPI()
+    exporter = HistoryExporter(api, str(tmpdir))
+    exporter.export()
+    os.remove(str(tmpdir.join('payments', history.KEY_INDEX)))
+    assert exporter.export()['payments'] == 0
+    assert tmpdir.join('payments', history.KEY_INDEX).exists()
@@ -0,0 +1,70 @@
+import logging
+import os
+
+import pytest
+
+from benchmarks.server import MockNumeraiServer, write_predictions
+from numerapi import NumerAPI
+from numerapi.api_manager import NumerApiManager
+from numerapi.memprofile import MemoryProfiler, compare
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=200, dataset_rows=200) as server:
+        yield server
+
+
+def test_operations_are_recorded(server: MockNumeraiServer, tmpdir):
+    profiler = MemoryProfiler()
+    api = NumerAPI(public_id='foo', secret_key='bar', profiler=profiler,
+                   manager=NumerApiManager(api_url=server.url))
+    try:
+        api.download_current_dataset(dest_path=str(tmpdir), dest_filename='ds.zip')
+        assert len(api.get_leaderboard(0)) == 200
+        tourn_file = os.path.join(str(tmpdir), 'ds', 'numerai_tournament_data.csv')
+        predictions = os.path.join(str(tmpdir), 'predictions.csv')
+        write_predictions(tourn_file, predictions)
+        api.upload_predictions(predictions)
+    finally:
+        profiler.stop()
+
+    report = profiler.report()
+    assert {'download', 'extract', 'json_decode', 'upload_read'} <= set(report)
+    # the decoded leaderboard is the largest JSON document
+    assert report['json_decode']['max_allocated'] > 200 * 100
+    assert report['upload_read']['max_allocated'] >= os.path.getsize(predictions)
+
+    path = str(tmpdir.join('report.json'))
+    profiler.save(path)
+    baseline = {op: dict(entry, max_allocated=entry['max_allocated'] // 2)
+                for op, entry in report.items()}
+    assert len(compare(report, baseline)) == len(report)
+    assert not compare(report, report)
+
+
+def test_budget_aborts(server: MockNumeraiServer):
+    profiler = MemoryProfiler(budget=1, abort=True)
+    api = NumerAPI(profiler=profiler, manager=NumerApiManager(api_url=server.url))
+    try:
+        with pytest.raises(RuntimeError):
+            api.get_leaderboard(0)
+    finally:
+        profiler.stop()
+
+
+def test_warns_once_before_the_budget(server: MockNumeraiServer, tmpdir, caplog):
+    profiler = MemoryProfiler(budget=2**40, abort=True, warn_at=1)
+    api = NumerAPI(profiler=profiler, manager=NumerApiManager(api_url=server.url))
+    try:
+        with caplog.at_level(logging.WARNING, logger='numerapi.memprofile'):
+            api.download_current_dataset(dest_path=str(tmpdir), dest_filename='ds.zip')
+    finally:
+        profiler.stop()
+
+    warnings = [r.getMessage() for r in caplog.records if r.name == 'numerapi.memprofile']
+    # once per operation, although downloads and extractions check every chunk
+    operations = [msg.split()[0] for msg in warnings]
+    assert {'download', 'extract'} <= set(operations)
+    assert len(operations) == len(set(operations))
+    assert all('close to the memory budget' in msg for msg in warnings)
@@ -1,8 +1,10 @@
 # method names of pytest fixtures has (for some reason) no prefix, resulting in "shadows name from outer scope"
 # pylint: disable=redefined-outer-name
 
+import json
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Generator
 from uuid import uuid4 as uuid
@@ -51,7 +53,7 @@ class NumerMockManager(object):
 
     class Leaderboard(object):
         def __init__(self):
-            self.submissions = list()
+            self.submissions = []
 
         def add_submission(self, submission):
             self.submissions.append(submission)
@@ -88,9 +90,9 @@ class NumerMockManager(object):
             return self.submission_id
 
     def __init__(self):
-        self.competitions = list()
-        self.leaderboards = dict()
-        self.stakes = list()
+        self.competitions = []
+        self.leaderboards = {}
+        self.stakes = []
         self.user_id = None
         self.user_name = None
 
@@ -108,13 +110,12 @@ class NumerMockManager(object):
         if number == -1:
             number = len(self.competitions) + 1
 
-        if number in self.leaderboards.keys():
+        if number in self.leaderboards:
             raise RuntimeError('round "%s" already exists' % str(number))
 
         self.leaderboards[number] = NumerMockManager.Leaderboard()
         self.competitions.append(NumerMockManager.Round(number, resolved))
 
-    # pylint: disable=no-self-use
     def download_data_set(self, dataset_path: str) -> None:
         if not os.path.exists(dataset_path):
             shutil.copy(SAMPLE_DATA_SET_PATH, dataset_path)
@@ -264,7 +265,9 @@ class NumerMockManager(object):
             }
         }
 
-    def upload_predictions(self, _: str) -> dict:
+    # pylint: disable=unused-argument
+    def upload_predictions(self, _: str, tournament_data_path: str = None,
+                           data: bytes = None) -> dict:
         current_round = self.get_current_round()
         round_id = current_round['data']['rounds'][0]["number"]
         if round_id == -1:
@@ -399,8 +402,7 @@ class NumerMockManager(object):
 
 
 def type_hint_submissions(submissions: list) -> Generator[NumerMockManager.Submission, None, None]:
-    for submission in submissions:
-        yield submission
+    yield from submissions
 
 
 @pytest.fixture(name='api', scope='function')
@@ -477,8 +479,11 @@ def test_download_current_dataset(api: NumerAPI):
             for csv_file in csv_files:
                 os.remove(os.path.join(directory, csv_file))
 
+            os.remove(os.path.join(directory, '.complete'))
+            os.remove(os.path.join(directory, '.members.json'))
             os.removedirs(os.path.join(directory, 'numerai_dataset'))
             os.remove('%s.zip' % directory)
+            os.remove('%s.zip.lock' % directory)
 
 
 def test_get_current_round():
@@ -528,3 +533,126 @@ def test_error_handling_get_leaderboard_unknown_round_id(api: NumerAPI):
     # round that doesn't exist
     with pytest.raises(ValueError):
         api.get_leaderboard(-1)
+
+
+def test_import_is_lazy():
+    import subprocess
+    import sys
+
+    code = ('import sys, numerapi; numerapi.NumerAPI(); '
+            'assert "requests" not in sys.modules; '
+            'assert "zope.interface" not in sys.modules')
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_default_manager_created_on_first_use():
+    from numerapi.api_manager import NumerApiManager
+
+    api = NumerAPI(public_id='foo', secret_key='bar')
+    assert isinstance(api.manager, NumerApiManager)
+    assert api.manager.token == ('foo', 'bar')
+    assert api.manager is not NumerAPI().manager
+
+
+def test_concurrent_download_current_dataset_downloads_once(tmpdir):
+    import threading
+    import time
+
+    class CountingManager(NumerMockManager):  # pylint: disable=abstract-method
+        downloads = 0
+
+        def download_data_set(self, dataset_path: str) -> None:
+            CountingManager.downloads += 1
+            time.sleep(0.05)
+            super().download_data_set(dataset_path)
+
+    def download():
+        api = NumerAPI(manager=CountingManager())
+        paths.append(api.download_current_dataset(dest_path=str(tmpdir), dest_filename='ds'))
+
+    paths = []
+    threads = [threading.Thread(target=download) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert CountingManager.downloads == 1
+    assert len(paths) == 4
+    assert os.path.exists(str(tmpdir.join('ds', 'numerai_training_data.csv')))
+
+
+def test_unzip_links_unchanged_members(api: NumerAPI, tmpdir):
+    dest_path = str(tmpdir)
+    dataset_path = os.path.join(dest_path, 'round1.zip')
+    api.manager.download_data_set(dataset_path)
+    api.unzip_data_set(dest_path, dataset_path, 'round1.zip')
+    api.unzip_data_set(dest_path, dataset_path, 'round2.zip')
+
+    for name in ('numerai_tournament_data.csv', 'numerai_training_data.csv'):
+        first = os.stat(os.path.join(dest_path, 'round1', name))
+        second = os.stat(os.path.join(dest_path, 'round2', name))
+        assert (first.st_dev, first.st_ino) == (second.st_dev, second.st_ino)
+
+    # a modified earlier extraction is not used as a source
+    with open(os.path.join(dest_path, 'round2', 'numerai_training_data.csv'), 'a') as fh:
+        fh.write('extra\n')
+    api.unzip_data_set(dest_path, dataset_path, 'round3.zip')
+    third = os.stat(os.path.join(dest_path, 'round3', 'numerai_training_data.csv'))
+    assert third.st_nlink == 1
+
+
+def test_identical_upload_is_skipped(tmpdir):
+    api = NumerAPI(public_id='foo', secret_key='bar', manager=NumerMockManager(),
+                   upload_record=str(tmpdir.join('uploads.json')))
+    api.manager.create_competition(1)
+    predictions = tmpdir.join('predictions.csv')
+    predictions.write('id,probability\n1,0.5\n')
+    # the round is recorded at the download, uploads do not look it up
+    api.download_current_dataset(dest_path=str(tmpdir), unzip=False)
+    assert json.loads(tmpdir.join('uploads.json').read())['round'] == 1
+    first = api.upload_predictions(str(predictions))
+    assert api.upload_predictions(str(predictions)) == first
+    assert len(api.get_leaderboard(1)) == 1
+    assert api.upload_predictions(str(predictions), force=True) != first
+
+    # other content, another account or another round is uploaded
+    predictions.write('id,probability\n1,0.6\n')
+    assert api.upload_predictions(str(predictions)) != first
+    other = NumerAPI(public_id='baz', secret_key='qux', manager=api.manager,
+                     upload_record=api.upload_record)
+    assert other.upload_predictions(str(predictions)) != api.submission_id
+    # sharing the manager does not change the first client's account
+    assert api.manager.user_id == 'foo'
+    api.manager.create_competition(2)
+    api.download_current_dataset(dest_path=str(tmpdir), unzip=False)
+    # concurrent uploads of the same content wait for the first one
+    with ThreadPoolExecutor(4) as pool:
+        ids = set(pool.map(lambda _: api.upload_predictions(str(predictions)), range(4)))
+    assert len(ids) == 1
+    assert len(api.get_leaderboard(2)) == 1
+
+    # without a known round every upload is sent
+    unknown = NumerAPI(public_id='foo', secret_key='bar', manager=api.manager,
+                       upload_record=str(tmpdir.join('other.json')))
+    assert unknown.upload_predictions(str(predictions)) != \
+        unknown.upload_predictions(str(predictions))
+
+
+def test_invalid_rounds_and_submission_ids(api: NumerAPI):
+    for round_num in ('82', 82.0, True, -3):
+        with pytest.raises(ValueError):
+            api.get_staking_leaderboard(round_num)
+    with pytest.raises(ValueError):
+        api.submission_status('not-a-uuid')
+
+    # rounds are only rejected once get_competitions has listed them
+    api.manager.create_competition(number=5)
+    assert api.get_staking_leaderboard(5) == []
+    api.get_competitions()
+    with pytest.raises(ValueError, match='no such round 6'):
+        api.get_leaderboard(6)
+    assert api.get_leaderboard(5) == []
+    # a round opened since the last listing is found by listing again
+    api.manager.create_competition(number=6)
+    assert api.get_leaderboard(6) == []
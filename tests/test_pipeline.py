@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+import zipfile
+
+import pytest
+
+from benchmarks.server import MockNumeraiServer
+from numerapi import NumerAPI, featurestats
+from numerapi.api_manager import NumerApiManager
+from numerapi import pipeline as pipeline_module
+from numerapi.pipeline import RoundPipeline
+from tests.test_numerapi import NumerMockManager
+
+
+def predict(batch):
+    return [0.5] * len(batch.ids)
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=10, dataset_rows=2500) as server:
+        yield server
+
+
+def test_streaming_pipeline_uploads_predictions(server: MockNumeraiServer, tmpdir):
+    api = NumerAPI('foo', 'bar', manager=NumerApiManager(server.url))
+    pipeline = RoundPipeline(api, predict, dest_path=str(tmpdir), dest_filename='ds',
+                             batch_size=1000, workers=2)
+    assert pipeline.run()
+
+    with zipfile.ZipFile(pipeline.dataset_path) as z:
+        for name in ('numerai_training_data.csv', 'numerai_tournament_data.csv'):
+            with open(os.path.join(pipeline.unzip_path, name), 'rb') as fh:
+                assert fh.read() == z.read('numerai_dataset/' + name)
+    with open(pipeline.predictions_path) as fh:
+        lines = fh.read().splitlines()
+    assert lines[0] == 'id,probability'
+    assert len(lines) == 2501
+    assert server.uploads[-1] == os.path.getsize(pipeline.predictions_path)
+
+    # the streamed extraction is indexed like unzip_data_set's
+    with open(os.path.join(pipeline.unzip_path, '.members.json')) as fh:
+        members = json.load(fh)
+    with zipfile.ZipFile(pipeline.dataset_path) as z:
+        assert set(members) == {'{}:{:08x}:{}'.format(os.path.basename(i.filename), i.CRC, i.file_size)
+                                for i in z.infolist() if not i.is_dir()}
+    assert featurestats.dataset_id(pipeline.unzip_path) in \
+        {key.split(':', 1)[1].replace(':', '-') for key in members}
+
+    # the second run reuses the extracted data
+    requests_before = server.requests
+    pipeline.run()
+    assert server.requests - requests_before == 3
+
+
+def test_failing_predict_stops_the_download(server: MockNumeraiServer, tmpdir, monkeypatch):
+    monkeypatch.setattr(pipeline_module, 'QUEUE_CHUNKS', 1)
+
+    def fail(batch):
+        raise RuntimeError('model failed')
+
+    api = NumerAPI('foo', 'bar', manager=NumerApiManager(server.url))
+    pipeline = RoundPipeline(api, fail, dest_path=str(tmpdir), dest_filename='ds',
+                             batch_size=100, workers=1)
+    with pytest.raises(RuntimeError, match='model failed'):
+        pipeline.run()
+    assert not any(t.name == 'numerapi-fetch' for t in threading.enumerate())
+    assert not os.path.exists(pipeline.dataset_path + '.part')
+    assert not os.path.exists(pipeline.dataset_path)
+
+
+def test_pipeline_without_http_session(tmpdir):
+    manager = NumerMockManager()
+    manager.create_competition(1)
+    api = NumerAPI('foo', 'bar', manager=manager)
+    pipeline = RoundPipeline(api, predict, dest_path=str(tmpdir), dest_filename='ds')
+    assert pipeline.run()
+    with open(pipeline.predictions_path) as fh:
+        assert len(fh.readlines()) == 1500
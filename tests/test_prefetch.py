@@ -0,0 +1,46 @@
+import os
+import time
+
+from numerapi import NumerAPI
+from numerapi.prefetch import DatasetPrefetcher, read_current
+from tests.test_numerapi import NumerMockManager
+
+
+def test_prefetch_only_on_new_round(tmpdir):
+    cache_dir = str(tmpdir)
+    manager = NumerMockManager()
+    manager.create_competition(1)
+    prefetcher = DatasetPrefetcher(NumerAPI(manager=manager), cache_dir)
+
+    assert read_current(cache_dir) is None
+    assert prefetcher.check()
+    assert not prefetcher.check()
+
+    current = read_current(cache_dir)
+    assert current['round'] == 1
+    assert len(current['competitions']) == 1
+    assert os.path.exists(os.path.join(current['unzip_path'], 'numerai_training_data.csv'))
+
+    manager.create_competition(2)
+    assert prefetcher.check()
+    assert read_current(cache_dir)['round'] == 2
+
+
+def test_prefetcher_resumes_from_cache(tmpdir):
+    manager = NumerMockManager()
+    manager.create_competition(1)
+    DatasetPrefetcher(NumerAPI(manager=manager), str(tmpdir)).check()
+
+    prefetcher = DatasetPrefetcher(NumerAPI(manager=manager), str(tmpdir))
+    assert prefetcher.round_num == 1
+    assert not prefetcher.check()
+
+
+def test_background_thread(tmpdir):
+    manager = NumerMockManager()
+    manager.create_competition(1)
+    with DatasetPrefetcher(NumerAPI(manager=manager), str(tmpdir), interval=0.01):
+        deadline = time.time() + 5
+        while read_current(str(tmpdir)) is None and time.time() < deadline:
+            time.sleep(0.01)
+    assert read_current(str(tmpdir))['round'] == 1
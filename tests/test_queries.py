@@ -0,0 +1,43 @@
+import pytest
+
+from numerapi import queries
+
+
+def test_minify_keeps_only_separating_whitespace():
+    document = '''
+        # current round
+        query($number: Int!, $name: String) {
+          rounds(number: $number) {
+            leaderboard { username  }
+          }
+          user(name: "a  b") { id }
+        }
+    '''
+    assert queries.minify(document) == \
+        'query($number:Int!,$name:String){rounds(number:$number)' \
+        '{leaderboard{username}}user(name:"a  b"){id}}'
+
+
+def test_compile_is_cached_and_hashed():
+    compiled = queries.compile(queries.LEADERBOARD.text)
+    assert compiled == queries.LEADERBOARD
+    assert queries.compile('query {dataset}') is queries.DATASET
+    assert len(queries.DATASET.sha256) == 64
+    assert len(queries.LEADERBOARD.text) < 400
+
+
+def test_signature_and_check_variables():
+    assert queries.signature(queries.STAKE.text) == {
+        'code': ('String', False), 'confidence': ('String!', True),
+        'password': ('String', False), 'round': ('Int!', True), 'value': ('String!', True)}
+    assert queries.signature('query($n: [Int!] = [1]) { a }') == {'n': ('[Int!]', False)}
+    assert queries.signature(queries.DATASET.text) == {}
+
+    queries.check_variables(queries.LEADERBOARD.text, {'number': 80})
+    queries.check_variables('query($n: [Int!], $x: Float) { a }', {'n': [1, 2], 'x': 1})
+    for variables in ({}, {'number': '80'}, {'number': True}, {'number': None},
+                      {'number': 80, 'other': 1}):
+        with pytest.raises(ValueError):
+            queries.check_variables(queries.LEADERBOARD.text, variables)
+    with pytest.raises(ValueError):
+        queries.check_variables('query($n: [Int!]) { a }', {'n': [1, None]})
@@ -0,0 +1,57 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from numerapi.scoring import ValidationData, score, score_many  # noqa: E402  pylint: disable=wrong-import-position
+
+SAMPLE_RESULT_PATH = 'tests/data/sample_result.csv'
+
+
+def test_score_matches_plain_python(tournament_data):
+    data = ValidationData.from_csv(tournament_data)
+    result = score(SAMPLE_RESULT_PATH, data)
+
+    probabilities = data.align(SAMPLE_RESULT_PATH)
+    expected = -sum(y * math.log(p) + (1 - y) * math.log(1 - p)
+                    for y, p in zip(data.targets, probabilities)) / len(data)
+    assert result['validation_logloss'] == pytest.approx(expected)
+    assert list(result['era_logloss']) == ['era97']
+    assert result['consistency'] in (0.0, 100.0)
+
+
+def test_constant_half_is_not_consistent(tournament_data):
+    data = ValidationData.from_csv(tournament_data)
+    result = score(np.full(len(data), 0.5), data)
+    assert result['validation_logloss'] == pytest.approx(math.log(2))
+    assert result['consistency'] == 0.0
+
+
+def test_missing_predictions_raise(tournament_data):
+    with pytest.raises(ValueError):
+        score({'1': 0.5}, tournament_data)
+
+
+def test_score_many_keeps_order(tournament_data):
+    data = ValidationData.from_csv(tournament_data)
+    candidates = [np.full(len(data), 0.5), data.targets * 0.8 + 0.1]
+    results = score_many(candidates, data, processes=2)
+    assert results[0]['validation_logloss'] > results[1]['validation_logloss']
+    assert results[1]['consistency'] == 100.0
+
+
+def test_per_era_logloss_and_consistency():
+    # rows of the eras interleaved; two of three eras beat -ln(0.5)
+    data = ValidationData(ids=['a', 'b', 'c', 'd', 'e'],
+                          eras=['era2', 'era1', 'era3', 'era1', 'era2'],
+                          targets=[1, 1, 0, 0, 1])
+    result = score([0.9, 0.8, 0.7, 0.2, 0.6], data)
+    assert result['era_logloss'] == pytest.approx({
+        'era1': -math.log(0.8),
+        'era2': -(math.log(0.9) + math.log(0.6)) / 2,
+        'era3': -math.log(0.3),
+    })
+    assert result['validation_logloss'] == pytest.approx(
+        -(math.log(0.9) + math.log(0.8) + math.log(0.3) + math.log(0.8) + math.log(0.6)) / 5)
+    assert result['consistency'] == pytest.approx(200 / 3)
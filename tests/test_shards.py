@@ -0,0 +1,56 @@
+import csv
+import zipfile
+
+import pytest
+
+from numerapi.shards import assign, open_shards, read_manifest, shard_dataset
+
+
+@pytest.fixture(name='unzip_path')
+def fixture_for_unzip_path(tmpdir):
+    with zipfile.ZipFile('tests/data/numerai_dataset.zip') as z:
+        for name in ('numerai_training_data.csv', 'numerai_tournament_data.csv'):
+            with z.open('numerai_dataset/' + name) as src:
+                tmpdir.join(name).write_binary(src.read())
+    return str(tmpdir)
+
+
+def read_rows(unzip_path, name):
+    with open('{}/{}'.format(unzip_path, name), newline='') as fh:
+        return list(csv.DictReader(fh))
+
+
+def test_shards_hold_all_rows_grouped_by_era(unzip_path):
+    # interleave the eras of the tournament data
+    rows = read_rows(unzip_path, 'numerai_tournament_data.csv')
+    rows = rows[::2] + rows[1::2]
+    with open(unzip_path + '/numerai_tournament_data.csv', 'w', newline='') as fh:
+        writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    manifest = shard_dataset(unzip_path)
+    assert manifest == read_manifest(unzip_path + '/shards')
+    eras = [shard['era'] for shard in manifest['tournament']['shards']]
+    assert sorted(eras) == ['era97', 'eraX']
+
+    for i, era in enumerate(eras):
+        with open_shards(unzip_path + '/shards', 'tournament', i, i + 1) as fh:
+            shard_rows = list(csv.DictReader(fh))
+        assert shard_rows == [row for row in rows if row['era'] == era]
+        assert len(shard_rows) == manifest['tournament']['shards'][i]['rows']
+
+    with open_shards(unzip_path + '/shards', 'training') as fh:
+        assert list(csv.DictReader(fh)) == read_rows(unzip_path, 'numerai_training_data.csv')
+
+
+def test_assign_covers_all_shards_contiguously(unzip_path):
+    manifest = shard_dataset(unzip_path, tables=('training',))
+    n_shards = len(manifest['training']['shards'])
+    for nodes in (1, 2, 3, n_shards, n_shards + 2):
+        ranges = [assign(manifest, 'training', node, nodes) for node in range(nodes)]
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == n_shards
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    with pytest.raises(ValueError):
+        assign(manifest, 'training', 2, 2)
@@ -0,0 +1,81 @@
+import csv
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from numerapi import shared  # noqa: E402  pylint: disable=wrong-import-position
+from numerapi.shared import share_dataset  # noqa: E402  pylint: disable=wrong-import-position
+
+
+@pytest.fixture(name='unzip_path', scope='module')
+def fixture_for_unzip_path(tmpdir_factory):
+    path = tmpdir_factory.mktemp('data')
+    with zipfile.ZipFile('tests/data/numerai_dataset.zip') as z:
+        for name in ('numerai_training_data.csv', 'numerai_tournament_data.csv'):
+            with z.open('numerai_dataset/' + name) as src:
+                path.join(name).write_binary(src.read())
+    return str(path)
+
+
+def summarize(handle):
+    dataset = handle.attach()
+    try:
+        table = dataset['tournament']
+        return (len(table), float(table.features.sum()), table.ids[0],
+                table.era_names[table.eras[-1]])
+    finally:
+        del table
+        dataset.close()
+
+
+def test_tables_match_csv(unzip_path):
+    with open(unzip_path + '/numerai_tournament_data.csv', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+    with share_dataset(unzip_path) as dataset:
+        table = dataset['tournament']
+        assert len(table) == len(rows)
+        assert table.ids[3].decode() == rows[3]['id']
+        assert table.era_names[table.eras[3]] == rows[3]['era']
+        assert table.data_type_names[table.data_types[-1]] == rows[-1]['data_type']
+        assert table.features[3, 0] == np.float32(rows[3]['feature1'])
+        assert table.features.shape[1] == len(table.feature_names)
+        validation = table.data_type_names.index('validation')
+        assert not np.isnan(table.targets[table.data_types == validation]).any()
+        assert np.isnan(table.targets[table.data_types != validation]).all()
+        assert len(dataset['training']) > 0
+        del table
+
+
+def test_chunks_fill_the_whole_table(unzip_path, monkeypatch):
+    with open(unzip_path + '/numerai_training_data.csv', newline='') as fh:
+        rows = list(csv.DictReader(fh))
+    monkeypatch.setattr(shared, 'CHUNK_ROWS', 7)
+    with share_dataset(unzip_path, tables=('training',)) as dataset:
+        table = dataset['training']
+        assert [i.decode() for i in table.ids] == [row['id'] for row in rows]
+        assert [table.era_names[code] for code in table.eras] == [row['era'] for row in rows]
+        assert table.era_names == sorted(table.era_names)
+        expected = [[float(row[name]) for name in table.feature_names] for row in rows]
+        assert np.array_equal(table.features, np.asarray(expected, dtype=np.float32))
+        assert np.array_equal(table.targets, np.asarray([row['target'] for row in rows],
+                                                        dtype=np.float32))
+        del table
+
+
+def test_children_attach_without_parsing(unzip_path):
+    with share_dataset(unzip_path, tables=('tournament',)) as dataset:
+        table = dataset['tournament']
+        expected = (len(table), float(table.features.sum()), table.ids[0],
+                    table.era_names[table.eras[-1]])
+        del table
+        with ProcessPoolExecutor(2) as pool:
+            results = list(pool.map(summarize, [dataset.handle] * 2))
+    assert results == [expected, expected]
+
+
+def test_unknown_table(unzip_path):
+    with pytest.raises(ValueError):
+        share_dataset(unzip_path, tables=('live',))
@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.server import MockNumeraiServer
+from numerapi import NumerAPI
+from numerapi.api_manager import NumerApiManager
+from numerapi.userindex import UserIndex
+
+
+@pytest.fixture(name='server', scope='module')
+def fixture_for_server():
+    with MockNumeraiServer(leaderboard_size=20, dataset_rows=20) as server:
+        yield server
+
+
+def test_update_fetches_only_open_and_new_rounds(server: MockNumeraiServer, tmpdir):
+    api = NumerAPI(manager=NumerApiManager(api_url=server.url))
+    index = UserIndex()
+    assert index.update(api, since=88) == [88, 89, 90]
+    # round 90 is not resolved yet
+    assert index.update(api, since=88) == [90]
+
+    history = index.user_history('user3')
+    assert [row['round'] for row in history] == [88, 89, 90]
+    assert history[0]['username'] == 'user3'
+    assert index.user_history('nobody') == []
+
+    submission_id = history[0]['submissionId']
+    assert index.find_submission(submission_id)['username'] == 'user3'
+
+    path = str(tmpdir.join('index.json.gz'))
+    index.save(path)
+    loaded = UserIndex.load(path)
+    assert loaded.user_history('user3') == history
+    assert loaded.update(api, since=88) == [90]
+
+
+def test_replacing_a_round_drops_old_rows():
+    index = UserIndex()
+    index.add_round(1, [{'username': 'a', 'submissionId': 'x'}])
+    index.add_round(1, [{'username': 'b', 'submissionId': 'y'}],
+                    staking_leaderboard=[{'username': 'b', 'stake': {'soc': '1'}}])
+    assert index.user_history('a') == []
+    assert index.find_submission('x') is None
+    assert index.user_history('b') == [
+        {'username': 'b', 'submissionId': 'y', 'round': 1, 'stake': {'soc': '1'}}]
+
+
+def test_rows_are_stored_positionally(server: MockNumeraiServer, tmpdir):
+    import gzip
+    import json
+
+    index = UserIndex()
+    for round_num in (1, 2):
+        index.add_round(round_num, server.leaderboard)
+    original = dict(server.leaderboard[3])
+    del original['stake']  # not a tracked field of the leaderboard
+    assert index.user_history('user3') == [dict(original, round=1), dict(original, round=2)]
+
+    path = str(tmpdir.join('index.json.gz'))
+    index.save(path)
+    with gzip.open(path, 'rb') as fh:
+        state = json.loads(fh.read().decode('utf-8'))
+    # each username once, rounds hold user numbers and one list per field
+    assert len(state['usernames']) == len(server.leaderboard)
+    _, _, users, columns, _, _ = state['rounds'][1]
+    assert users == list(range(len(server.leaderboard)))
+    assert columns['liveLogloss'][3] == original['liveLogloss']
@@ -0,0 +1,42 @@
+import pytest
+
+from numerapi.validation import validate_predictions
+
+SAMPLE_RESULT_PATH = 'tests/data/sample_result.csv'
+
+
+def write(tmpdir, content: str) -> str:
+    path = tmpdir.join('predictions.csv')
+    path.write(content)
+    return str(path)
+
+
+def test_sample_result_is_valid(tournament_data):
+    validate_predictions(SAMPLE_RESULT_PATH, tournament_data)
+
+
+@pytest.mark.parametrize('content', [
+    '',
+    'id,prob\n1,0.5\n',
+    'id,probability\n1,0.5\n1,0.4\n',
+    'id,probability\n1,0\n',
+    'id,probability\n1,nan\n',
+    'id,probability\n1,abc\n',
+])
+def test_invalid_files(tmpdir, content):
+    with pytest.raises(ValueError):
+        validate_predictions(write(tmpdir, content))
+
+
+def test_incomplete_ids(tmpdir, tournament_data):
+    with open(SAMPLE_RESULT_PATH) as fh:
+        lines = fh.readlines()
+    path = write(tmpdir, ''.join(lines[:-1]))
+    validate_predictions(path)
+    with pytest.raises(ValueError):
+        validate_predictions(path, tournament_data)
+
+
+def test_short_row(tmpdir):
+    with pytest.raises(ValueError):
+        validate_predictions(write(tmpdir, 'probability,id\n0.5,1\n0.5\n'))